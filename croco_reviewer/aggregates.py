@@ -0,0 +1,222 @@
+from array import array
+from datetime import date
+from typing import Dict, List, Optional, Any, Iterable, Tuple
+
+# Веса проблем в оценке коммита: 10 минус взвешенное число проблем
+DEFAULT_PROBLEM_WEIGHTS = {
+    "minor": 0.5,
+    "regular": 1.,
+    "critical": 1.5
+}
+PROBLEM_LEVELS = ("minor", "regular", "critical")
+COMPLEXITIES = ("S", "M", "L")
+
+
+def score_review(review: Dict[str, Any], weights: Dict[str, float] = DEFAULT_PROBLEM_WEIGHTS) -> float:
+    """Оценка одного ревью по найденным проблемам."""
+    problems = review.get("problems") or {}
+    return 10. - sum(len(problems.get(level) or []) * weights[level] for level in PROBLEM_LEVELS)
+
+
+class _Codes:
+    """Словарь строковых значений колонки: значение <-> целочисленный код."""
+
+    def __init__(self):
+        self.names: List[str] = []
+        self._codes: Dict[str, int] = {}
+
+    def code(self, name: str) -> int:
+        code = self._codes.get(name)
+        if code is None:
+            code = self._codes[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+
+class ReviewColumns:
+    """
+    Колоночное представление набора ревью для агрегатов без повторных запросов к модели.
+
+    Каждое поле хранится в отдельном компактном массиве (array), строки — кодами
+    словаря, поэтому десятки тысяч ревью занимают мегабайты, а пересчёт оценок с
+    другими весами — один проход по трём целочисленным колонкам.
+    """
+
+    def __init__(self):
+        self.repos = _Codes()
+        self.authors = _Codes()
+        self.problem_types = _Codes()
+        self.repo = array("i")
+        self.author = array("i")
+        self.day = array("i")          # date.toordinal() даты коммита
+        self.complexity = array("b")   # индекс в COMPLEXITIES или -1
+        self.minor = array("i")
+        self.regular = array("i")
+        self.critical = array("i")
+        # Проблемы по отдельности: уровень и код типа
+        self.problem_level = array("b")
+        self.problem_type = array("i")
+
+    def __len__(self) -> int:
+        return len(self.day)
+
+    def append(self, repo: str, author: str, item_date: str, review: Dict[str, Any]):
+        """Добавить ревью (дата — в ISO-формате, используются первые 10 символов)."""
+        self.repo.append(self.repos.code(repo))
+        self.author.append(self.authors.code(author))
+        self.day.append(date.fromisoformat(item_date[:10]).toordinal())
+        complexity = review.get("complexity")
+        self.complexity.append(COMPLEXITIES.index(complexity) if complexity in COMPLEXITIES else -1)
+
+        problems = review.get("problems") or {}
+        for level_index, level in enumerate(PROBLEM_LEVELS):
+            items = problems.get(level) or []
+            getattr(self, level).append(len(items))
+            for item in items:
+                problem_type = (item.get("type") if isinstance(item, dict) else None) or "—"
+                self.problem_level.append(level_index)
+                self.problem_type.append(self.problem_types.code(problem_type.strip()))
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[str, str, str, Dict[str, Any]]]) -> "ReviewColumns":
+        """Построить колонки из строк (repo, user, дата, ревью), например из ReviewHistory.iter_reviews."""
+        columns = cls()
+        for repo, author, item_date, review in rows:
+            columns.append(repo, author, item_date, review)
+        return columns
+
+    def scores(self, weights: Dict[str, float] = DEFAULT_PROBLEM_WEIGHTS) -> array:
+        """Оценки всех ревью при заданных весах проблем."""
+        w_minor, w_regular, w_critical = (weights[level] for level in PROBLEM_LEVELS)
+        return array("d", (
+            10. - (minor * w_minor + regular * w_regular + critical * w_critical)
+            for minor, regular, critical in zip(self.minor, self.regular, self.critical)
+        ))
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    """Перцентиль с линейной интерполяцией, как numpy.percentile по умолчанию."""
+    position = (len(sorted_values) - 1) * q / 100.
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(values: Iterable[float], percentiles: Tuple[int, ...] = (10, 25, 50, 75, 90)) -> Dict[str, Any]:
+    """Число, среднее, минимум, максимум и перцентили набора оценок."""
+    sorted_values = sorted(values)
+    if not sorted_values:
+        return {"count": 0}
+    summary = {
+        "count": len(sorted_values),
+        "mean": sum(sorted_values) / len(sorted_values),
+        "min": sorted_values[0],
+        "max": sorted_values[-1]
+    }
+    for q in percentiles:
+        summary[f"p{q}"] = _percentile(sorted_values, q)
+    return summary
+
+
+def _period_label(day: int, period: str) -> str:
+    value = date.fromordinal(day)
+    if period == "week":
+        year, week, _ = value.isocalendar()
+        return f"{year}-W{week:02d}"
+    if period == "day":
+        return value.isoformat()
+    return f"{value.year}-{value.month:02d}"
+
+
+def _group(codes: Iterable[int], values: array) -> Dict[Any, List[float]]:
+    groups = {}
+    for code, value in zip(codes, values):
+        groups.setdefault(code, []).append(value)
+    return groups
+
+
+def _trend(series: List[Dict[str, Any]]) -> Optional[float]:
+    """Наклон средней оценки по периодам (метод наименьших квадратов), в баллах за период."""
+    if len(series) < 2:
+        return None
+    n = len(series)
+    mean_x = (n - 1) / 2.
+    mean_y = sum(point["mean"] for point in series) / n
+    numerator = sum((x - mean_x) * (point["mean"] - mean_y) for x, point in enumerate(series))
+    denominator = sum((x - mean_x) ** 2 for x in range(n))
+    return numerator / denominator
+
+
+def aggregate(columns: ReviewColumns, weights: Optional[Dict[str, float]] = None,
+              period: str = "month", top_problem_types: int = 20) -> Dict[str, Any]:
+    """
+    Сводная статистика по набору ревью.
+
+    :param weights: Веса проблем для пересчёта оценок (по умолчанию — как при анализе)
+    :param period: Размер периода для динамики: "day", "week" или "month"
+    :param top_problem_types: Сколько самых частых типов проблем выводить на каждый уровень
+    :return: Распределения оценок в целом, по авторам, репозиториям, сложности и периодам,
+        тренды по авторам и гистограммы типов проблем
+    """
+    if period not in ("day", "week", "month"):
+        raise ValueError(f"Неизвестный период: {period}")
+    weights = {**DEFAULT_PROBLEM_WEIGHTS, **(weights or {})}
+    scores = columns.scores(weights)
+
+    period_labels = {}
+    for day in set(columns.day):
+        period_labels[day] = _period_label(day, period)
+    periods = [period_labels[day] for day in columns.day]
+
+    by_period = [
+        {"period": label, **summarize(values)}
+        for label, values in sorted(_group(periods, scores).items())
+    ]
+
+    rows_by_author = {}
+    for row, author_code in enumerate(columns.author):
+        rows_by_author.setdefault(author_code, []).append(row)
+
+    by_author = {}
+    for author_code, author_rows in rows_by_author.items():
+        author_scores = [scores[row] for row in author_rows]
+        series = [
+            {"period": label, "mean": sum(values) / len(values), "count": len(values)}
+            for label, values in sorted(_group((periods[row] for row in author_rows), author_scores).items())
+        ]
+        by_author[columns.authors.names[author_code]] = {
+            **summarize(author_scores),
+            "by_period": series,
+            "trend": _trend(series)
+        }
+
+    by_complexity = {
+        (COMPLEXITIES[code] if code >= 0 else "unknown"): summarize(values)
+        for code, values in sorted(_group(columns.complexity, scores).items())
+    }
+
+    problem_types = {}
+    for level_index, level in enumerate(PROBLEM_LEVELS):
+        counts = {}
+        for problem_level, problem_type in zip(columns.problem_level, columns.problem_type):
+            if problem_level == level_index:
+                counts[problem_type] = counts.get(problem_type, 0) + 1
+        top = sorted(counts.items(), key=lambda item: item[1], reverse=True)[:top_problem_types]
+        problem_types[level] = {columns.problem_types.names[code]: count for code, count in top}
+
+    return {
+        "weights": weights,
+        "period": period,
+        "overall": summarize(scores),
+        "problems": {
+            level: sum(getattr(columns, level)) for level in PROBLEM_LEVELS
+        },
+        "by_author": by_author,
+        "by_repo": {
+            columns.repos.names[code]: summarize(values)
+            for code, values in _group(columns.repo, scores).items()
+        },
+        "by_complexity": by_complexity,
+        "by_period": by_period,
+        "problem_types": problem_types
+    }
@@ -1,44 +1,40 @@
 import os
-import json
+import threading
+import time
+from datetime import date, timedelta
+from concurrent.futures import ThreadPoolExecutor, Future, FIRST_COMPLETED, as_completed, wait
 from yandex_cloud_ml_sdk import YCloudML
-from typing import Dict, List, Tuple, Optional, Any
+from typing import Dict, List, Tuple, Optional, Any, Callable, Iterator, Iterable, Set
 
-from diffs_collectors import GitHubDiffsCollector
+from diffs_collectors import GitHubDiffsCollector, GitHubPRDiffCollector
+from backoff import backoff_delay
+from caches import ReviewCache
+from history import ReviewHistory
+from llm_limiter import LLMRateLimiter
+from aggregates import DEFAULT_PROBLEM_WEIGHTS, score_review
+from review_schema import ReviewParseError, parse_review, parse_batch_reviews, PARSE_STATS
+from prompt_packing import estimate_tokens, pack_diff, trim_usages, merge_reviews
 
 LOCAL_REPO_PATH = ''
+# Минимальный бюджет на diff, даже если инструкция и применения заняли почти всё место
+MIN_DIFF_TOKENS = 500
+# Заголовок коммита в промпте с пачкой коммитов
+BATCH_ITEM_OVERHEAD_TOKENS = 40
 
-class CodeReviewPrompts:
-    """Класс для управления промптами для ревью кода."""
-
-    @staticmethod
-    def get_review_prompt(diff: str, commit_url: str, mr_number: int,
-                          usages: Dict[str, List[Tuple[str, int, str]]]) -> str:
-        """Сгенерировать промпт для анализа MR."""
-        
-        usages_str = "\n".join(
-            f"- {ident}: используется в {', '.join(f'{os.path.relpath(f, LOCAL_REPO_PATH)}:{line}' for f, line, _ in usage_list)}"
-            for ident, usage_list in usages.items()
-        ) or "Нет явных применений"
-
-        return f"""
-Вы — AI-ассистент для анализа Merge Request (MR) в проектах на Java, Python, PHP.
+# Общие части промптов для одного коммита и для пачки коммитов
+REVIEW_INTRO = """Вы — AI-ассистент для анализа Merge Request (MR) в проектах на Java, Python, PHP.
 
 Ваша задача — провести ревью кода, оценить его качество, выявить проблемы, антипаттерны и положительные аспекты,  
-а также проанализировать **влияние изменений на остальной код**, где используются изменённые функции или классы.
---- DIFF ---
-{diff}
-
---- ФУНКЦИИ/КЛАССЫ, ГДЕ ПРИМЕНЯЮТСЯ ИЗМЕНЕНИЯ ---
-{usages_str}
+а также проанализировать **влияние изменений на остальной код**, где используются изменённые функции или классы."""
 
---- УТОЧНЕНИЕ ---
+REVIEW_CLARIFICATIONS = """--- УТОЧНЕНИЕ ---
 - "Минус" перед строкой означает удаление в коммите, "Плюс" - новую, строку, замену на то что было удалено.
 - Весь код ревью оценивай как коммит проекта, и проводи оценку в этом контексте.
 - Номера строк указывай относительно полного файла, в котором были произведены изменения. Например, если изменилась 55 строка, но в коммите она первая - должно быть "55".
-Точность номеров строки очень важна.
+Точность номеров строки очень важна."""
 
-Формат ответа (строго в JSON):
-{{
+# Формат ответа модели по одному коммиту (шаблон для str.format)
+REVIEW_JSON_FORMAT = """{{
   "mr_number": {mr_number},
   "url": "{commit_url}",
   "complexity": "S/M/L",
@@ -84,85 +80,819 @@ class CodeReviewPrompts:
       "affected_components": ["список затронутых компонентов"]
     }}
   ]
-}}
+}}"""
+
+
+class CodeReviewPrompts:
+    """Класс для управления промптами для ревью кода."""
+
+    @staticmethod
+    def format_usages(usages: Dict[str, List[Tuple[str, int, str]]]) -> str:
+        """Список применений изменённых идентификаторов для промпта."""
+        return "\n".join(
+            f"- {ident}: используется в {', '.join(f'{os.path.relpath(f, LOCAL_REPO_PATH)}:{line}' for f, line, _ in usage_list)}"
+            for ident, usage_list in usages.items()
+        ) or "Нет явных применений"
+
+    @staticmethod
+    def get_review_prompt(diff: str, commit_url: str, mr_number: int,
+                          usages: Dict[str, List[Tuple[str, int, str]]]) -> str:
+        """Сгенерировать промпт для анализа MR."""
+        
+        usages_str = CodeReviewPrompts.format_usages(usages)
+
+        return f"""
+{REVIEW_INTRO}
+--- DIFF ---
+{diff}
+
+--- ФУНКЦИИ/КЛАССЫ, ГДЕ ПРИМЕНЯЮТСЯ ИЗМЕНЕНИЯ ---
+{usages_str}
+
+{REVIEW_CLARIFICATIONS}
+
+Формат ответа (строго в JSON):
+{REVIEW_JSON_FORMAT.format(mr_number=mr_number, commit_url=commit_url)}
+
+"""
+
+    @classmethod
+    def get_review_prompts(cls, diff: str, commit_url: str, mr_number: int,
+                           usages: Dict[str, List[Tuple[str, int, str]]],
+                           token_budget: int) -> List[str]:
+        """
+        Сгенерировать промпты для анализа MR в пределах бюджета токенов.
+
+        Lock-файлы и сгенерированный код заменяются заглушками, список применений урезается,
+        а слишком большой diff делится на части по границам hunk'ов — по промпту на часть.
+        """
+        overhead = estimate_tokens(cls.get_review_prompt("", commit_url, mr_number, {}))
+        available = max(token_budget - overhead, 0)
+        # На применения отводится не больше четверти свободного места
+        usages = trim_usages(usages, available // 4)
+        usages_tokens = estimate_tokens(cls.get_review_prompt("", commit_url, mr_number, usages)) - overhead
+        chunks = pack_diff(diff, max(available - usages_tokens, MIN_DIFF_TOKENS))
+
+        if len(chunks) == 1:
+            return [cls.get_review_prompt(chunks[0], commit_url, mr_number, usages)]
+        return [
+            cls.get_review_prompt(f"[Часть {i} из {len(chunks)}]\n{chunk}", commit_url, mr_number, usages)
+            for i, chunk in enumerate(chunks, start=1)
+        ]
+
+    @classmethod
+    def get_batch_review_prompt(cls, commits: List[Tuple[str, str, int, Dict[str, List[Tuple[str, int, str]]]]]) -> str:
+        """
+        Сгенерировать один промпт для ревью нескольких небольших коммитов.
+
+        :param commits: Список (diff, commit_url, mr_number, usages)
+        :return: Промпт, на который модель отвечает JSON-массивом с ревью каждого коммита
+        """
+        commits_str = "\n\n".join(
+            f"""=== КОММИТ MR #{mr_number} ({commit_url}) ===
+--- DIFF ---
+{diff}
+
+--- ФУНКЦИИ/КЛАССЫ, ГДЕ ПРИМЕНЯЮТСЯ ИЗМЕНЕНИЯ ---
+{cls.format_usages(usages)}"""
+            for diff, commit_url, mr_number, usages in commits
+        )
+        item_format = REVIEW_JSON_FORMAT.format(
+            mr_number="номер MR из заголовка коммита", commit_url="URL из заголовка коммита"
+        )
+
+        return f"""
+{REVIEW_INTRO}
+Ниже приведены независимые коммиты ({len(commits)} шт.). Проведите ревью каждого коммита отдельно.
+
+{commits_str}
+
+{REVIEW_CLARIFICATIONS}
+
+Формат ответа (строго JSON-массив, по одному объекту на каждый коммит в том же порядке):
+[
+{item_format}
+]
 
 """
 
+    @staticmethod
+    def get_repair_prompt(answer: str, error: str, mr_number: int, commit_url: str) -> str:
+        """Промпт с просьбой исправить ответ, который не удалось разобрать как ревью."""
+        return f"""Твой ответ на запрос code review не удалось разобрать: {error}.
+
+Ответ:
+{answer}
+
+Верни то же ревью в виде одного корректного JSON-объекта с полями mr_number ({mr_number}), url ({commit_url}),
+complexity, problems (minor, regular, critical), antipatterns, positives, impacts. Не добавляй ничего, кроме JSON."""
+
 
 class YandexGPTReviewer:
     """Класс для взаимодействия с Yandex GPT API."""
 
-    def __init__(self, folder_id, access_token):
+    # gRPC-статусы, при которых запрос имеет смысл повторить
+    retry_statuses = {"RESOURCE_EXHAUSTED", "UNAVAILABLE", "DEADLINE_EXCEEDED", "ABORTED", "INTERNAL"}
+
+    def __init__(self, folder_id, access_token, model_name: str = "yandexgpt",
+                 model_version: str = "rc", temperature: float = 0.3,
+                 cache: Optional[ReviewCache] = None,
+                 limiter: Optional[LLMRateLimiter] = None,
+                 max_retries: int = 4, backoff_factor: float = 1.0, max_backoff: float = 60.):
+        """
+        :param cache: Кэш ответов модели
+        :param limiter: Общий ограничитель частоты, параллелизма и токенов
+        :param max_retries: Сколько раз повторять запрос при ошибках квоты и временных сбоях
+        :param backoff_factor: Базовая задержка экспоненциального backoff в секундах
+        :param max_backoff: Максимальная задержка между повторами
+        """
+        self.model_name = model_name
+        self.model_version = model_version
+        self.temperature = temperature
+        self.cache = cache
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
         self.sdk = YCloudML(folder_id=folder_id, auth=access_token)
-        self.model = self.sdk.models.completions("yandexgpt", model_version="rc").configure(temperature=0.3)
+        self.model = self.sdk.models.completions(model_name, model_version=model_version).configure(temperature=temperature)
 
     def review_code(self, prompt: str) -> Optional[str]:
-        """Отправить запрос на ревью кода в Yandex GPT."""
+        """Отправить запрос на ревью кода в Yandex GPT (или взять готовый ответ из кэша)."""
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(prompt, self.model_name, self.model_version, self.temperature)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+        text = self._run_with_retries(prompt)
+        if cache_key is not None and text:
+            self.cache.put(cache_key, text)
+        return text
+
+    def warm_up(self):
+        """Короткий запрос мимо кэша, чтобы соединение с моделью было открыто до первого анализа."""
+        self._call_model("ping")
+
+    @classmethod
+    def _error_status(cls, error: Exception) -> Optional[str]:
+        """Имя gRPC-статуса ошибки SDK, если он есть."""
+        code = getattr(error, "code", None)
+        if not callable(code):
+            return None
         try:
-            result = self.model.run([
-                {"role": "system", "text": "Code Review"},
-                {"role": "user", "text": prompt}
-            ])
-            return result[0].text
-        except Exception as e:
-            print(f"Ошибка при обращении к YandexGPT: {e}")
+            return getattr(code(), "name", None)
+        except Exception:
             return None
 
+    def _call_model(self, prompt: str) -> str:
+        messages = [
+            {"role": "system", "text": "Code Review"},
+            {"role": "user", "text": prompt}
+        ]
+        if self.limiter is None:
+            return self.model.run(messages)[0].text
+        with self.limiter.slot(estimate_tokens(prompt)) as usage:
+            result = self.model.run(messages)
+            total_tokens = getattr(getattr(result, "usage", None), "total_tokens", None)
+            if total_tokens:
+                usage["tokens"] = total_tokens
+            return result[0].text
+
+    def _run_with_retries(self, prompt: str) -> Optional[str]:
+        """Выполнить запрос к модели, повторяя его при ошибках квоты и временных сбоях."""
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self._call_model(prompt)
+            except Exception as e:
+                status = self._error_status(e)
+                retryable = status in self.retry_statuses or isinstance(e, (ConnectionError, TimeoutError))
+                if not retryable or attempt == self.max_retries:
+                    print(f"Ошибка при обращении к YandexGPT: {e}")
+                    if self.limiter is not None:
+                        self.limiter.record_failure()
+                    return None
+
+                delay = backoff_delay(attempt, self.backoff_factor, self.max_backoff)
+                if self.limiter is not None:
+                    self.limiter.record_retry()
+                    if status == "RESOURCE_EXHAUSTED":
+                        # Квота общая, поэтому притормаживаем все запросы, а не только этот
+                        self.limiter.pause(delay)
+                print(f"YandexGPT ответил ошибкой {status or type(e).__name__}, повтор через {delay:.1f} с")
+                time.sleep(delay)
+        return None
+
 
 class MergeRequestAnalyzer:
     """Основной класс для анализа Merge Requests."""
     def __init__(self, github_collector: GitHubDiffsCollector, 
                  prompt_generator: CodeReviewPrompts, 
-                 reviewer: YandexGPTReviewer):
+                 reviewer: YandexGPTReviewer,
+                 fetch_workers: int = 4,
+                 usage_workers: int = 2,
+                 review_workers: int = 4,
+                 token_budget: int = 8000,
+                 batch_token_budget: int = 0,
+                 batch_commit_tokens: int = 500,
+                 batch_max_commits: int = 10,
+                 pr_collector: Optional[GitHubPRDiffCollector] = None,
+                 history: Optional[ReviewHistory] = None):
+        """
+        :param token_budget: Бюджет токенов на один промпт; большие коммиты делятся на части
+        :param batch_token_budget: Бюджет токенов на промпт с пачкой мелких коммитов (0 — без пачек)
+        :param batch_commit_tokens: Коммиты с diff'ом не больше этого числа токенов считаются мелкими
+        :param batch_max_commits: Максимальное число коммитов в одной пачке
+        :param pr_collector: Коллектор PR для анализа на уровне Pull Request'ов
+        :param history: История ревью для инкрементального анализа
+        """
         self.github_collector = github_collector
+        self.pr_collector = pr_collector
+        self.history = history
         self.prompt_generator = prompt_generator
         self.reviewer = reviewer
+        self.token_budget = token_budget
+        self.batch_token_budget = batch_token_budget
+        self.batch_commit_tokens = batch_commit_tokens
+        self.batch_max_commits = batch_max_commits
 
-        self.problem_weights = {
-            'minor': 0.5,
-            'regular': 1.,
-            'critical': 1.5
+        self.problem_weights = dict(DEFAULT_PROBLEM_WEIGHTS)
+
+        # Ограничения параллелизма для каждой стадии конвейера
+        self.stage_limits = {
+            'fetch': threading.BoundedSemaphore(fetch_workers),
+            'usages': threading.BoundedSemaphore(usage_workers),
+            'review': threading.BoundedSemaphore(review_workers)
         }
+        self.prepare_workers = fetch_workers + usage_workers
+        self.review_workers = review_workers
+        self.max_workers = fetch_workers + usage_workers + review_workers
 
-    def analyze(self, repo: str, user: str, local_repo_path: str,
-                start_date: str, end_date: str) -> Dict[str, Any]:
-        """Основной метод анализа."""
-        commits = self.github_collector.get_user_commits(repo, user)
-        print(commits)
-        results = []
-        mean_score = 0
-        for idx, commit in enumerate(commits, start=1):
+    def _score(self, parsed: Dict[str, Any]) -> float:
+        """Посчитать оценку коммита по найденным проблемам."""
+        return score_review(parsed, self.problem_weights)
+
+    @property
+    def _model_label(self) -> str:
+        return f"{getattr(self.reviewer, 'model_name', '?')}/{getattr(self.reviewer, 'model_version', '?')}"
+
+    def _parse_review(self, review_json: str, idx: int, commit_url: str) -> Optional[Dict[str, Any]]:
+        """
+        Разобрать ответ модели с ревью одного коммита.
+
+        Если в ответе нет корректного ревью, модель один раз просят исправить собственный ответ —
+        это дешевле, чем повторять ревью целиком.
+        """
+        try:
+            review = parse_review(review_json)
+            PARSE_STATS.record(self._model_label, "parsed")
+            return review
+        except ReviewParseError as e:
+            error = e
+        print(f"Ошибка разбора ответа модели: {error}, просим исправить")
+
+        with self.stage_limits['review']:
+            repaired_json = self.reviewer.review_code(
+                self.prompt_generator.get_repair_prompt(review_json, str(error), idx, commit_url)
+            )
+        try:
+            review = parse_review(repaired_json or "")
+        except ReviewParseError as e:
+            print(f"Ответ модели не удалось исправить: {e}")
+            PARSE_STATS.record(self._model_label, "failed")
+            return None
+        PARSE_STATS.record(self._model_label, "repaired")
+        return review
+
+    def _finish_review(self, idx: int, commit_url: str, parsed: Dict[str, Any]) -> Tuple[Dict[str, Any], float]:
+        """
+        Проставить оценку разобранному ревью коммита.
+
+        Номер и ссылка берутся из подготовленного коммита, а не из ответа: модель их может пропустить или спутать.
+        """
+        parsed["mr_number"] = idx
+        parsed["url"] = commit_url
+        score = self._score(parsed)
+        parsed['score'] = f"{score}/10"
+        print(parsed)
+        print(f"MR #{idx} обработан: оценка {score}/10")
+        return parsed, score
+
+    def _prepare_commit(self, repo: str, local_repo_path: str, idx: int,
+                        commit: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Получить diff коммита (или итоговый diff PR) и применения изменённых идентификаторов."""
+        if "sha" in commit:
             sha = commit["sha"]
-            diff, commit_url = self.github_collector.get_commit_diff(repo, sha)
+            with self.stage_limits['fetch']:
+                diff, commit_url = self.github_collector.get_commit_diff(repo, sha)
+            label = f"Коммит {sha}"
+        else:
+            with self.stage_limits['fetch']:
+                diff, commit_url = self.pr_collector.get_pr_diff(repo, commit["number"])
+            label = f"PR #{commit['number']}"
 
-            if not diff.strip():
-                print(f"Коммит {sha} пустой, пропускаем.")
-                continue
+        if not diff.strip():
+            print(f"{label} пустой, пропускаем.")
+            return None
 
-            identifiers = self.github_collector.extract_changed_identifiers(diff)
+        identifiers = self.github_collector.extract_changed_identifiers(diff)
+        with self.stage_limits['usages']:
             usages = self.github_collector.find_usages(identifiers, local_repo_path)
 
-            prompt = self.prompt_generator.get_review_prompt(diff, commit_url, idx, usages)
+        return {"idx": idx, "label": label, "diff": diff, "url": commit_url, "usages": usages}
+
+    def _review_prepared(self, prepared: Dict[str, Any]) -> Optional[Tuple[Dict[str, Any], float]]:
+        """Отправить подготовленный коммит на ревью (при необходимости — по частям)."""
+        idx = prepared["idx"]
+        prompts = self.prompt_generator.get_review_prompts(
+            prepared["diff"], prepared["url"], idx, prepared["usages"], self.token_budget
+        )
+        if len(prompts) > 1:
+            print(f"{prepared['label']} разбит на {len(prompts)} частей")
+
+        reviews = []
+        for prompt in prompts:
+            with self.stage_limits['review']:
+                review_json = self.reviewer.review_code(prompt)
+            if not review_json:
+                return None
+            review = self._parse_review(review_json, idx, prepared["url"])
+            if review is None:
+                return None
+            reviews.append(review)
+
+        return self._finish_review(idx, prepared["url"], merge_reviews(reviews))
+
+    def _review_commit(self, repo: str, local_repo_path: str, idx: int, commit: Dict[str, Any],
+                       on_empty: Optional[Callable[[], None]] = None) -> Optional[Tuple[Dict[str, Any], float]]:
+        """
+        Провести один коммит через стадии получения diff, поиска применений и ревью.
+
+        :param on_empty: Вызывается, если коммит пропущен из-за пустого diff'а
+        """
+        prepared = self._prepare_commit(repo, local_repo_path, idx, commit)
+        if prepared is None:
+            if on_empty is not None:
+                on_empty()
+            return None
+        return self._review_prepared(prepared)
+
+    def _batch_tokens(self, item: Dict[str, Any]) -> Optional[int]:
+        """Токены коммита в промпте с пачкой или None, если коммит крупный и ревьюится отдельно."""
+        diff_tokens = estimate_tokens(item["diff"])
+        if diff_tokens > self.batch_commit_tokens:
+            return None
+        return diff_tokens + estimate_tokens(self.prompt_generator.format_usages(item["usages"])) \
+            + BATCH_ITEM_OVERHEAD_TOKENS
+
+    def _review_batch(self, batch: List[Dict[str, Any]]) -> Dict[int, Optional[Tuple[Dict[str, Any], float]]]:
+        """
+        Отправить пачку мелких коммитов одним запросом и разобрать ответ по коммитам.
+
+        Коммиты, для которых модель не вернула ревью, отправляются на ревью по отдельности.
+        """
+        prompt = self.prompt_generator.get_batch_review_prompt(
+            [(item["diff"], item["url"], item["idx"], item["usages"]) for item in batch]
+        )
+        with self.stage_limits['review']:
             review_json = self.reviewer.review_code(prompt)
+        parsed = []
+        if review_json:
+            try:
+                parsed = parse_batch_reviews(review_json)
+            except ReviewParseError as e:
+                # Повторный запрос не нужен: коммиты пачки и так уйдут на ревью по отдельности
+                print(f"Ошибка разбора ответа на пачку: {e}")
+                PARSE_STATS.record(self._model_label, "failed")
 
-            if review_json:
-                # print(review_json)
-                try:
-                    review_json = review_json.replace('```', '')
-                    parsed: dict = json.loads(review_json.strip())
-                    
-                    problems = parsed.get('problems')
-                    penalty = (len(problems.get('minor', []))*self.problem_weights['minor']) + (len(problems.get('regular', []))*self.problem_weights['regular']) + (len(problems.get('critical', []))*self.problem_weights['critical'])
-
-                    score = 10. - penalty
-                    mean_score+=score
-                    parsed['score'] = f"{score}/10"
-
-                    results.append(parsed)
-                    print(parsed)
-                    print(f"MR #{idx} обработан: оценка {score}/10")
-                except json.JSONDecodeError as e:
-                    print(f"Ошибка парсинга JSON от модели: {e}")
+        by_idx = {}
+        for review in parsed:
+            if review["mr_number"] is not None:
+                by_idx.setdefault(review["mr_number"], review)
+
+        results = {}
+        for item in batch:
+            review = by_idx.get(item["idx"])
+            if review is None:
+                print(f"Пачка не вернула ревью для MR #{item['idx']}, отправляем отдельно")
+                results[item["idx"]] = self._review_prepared(item)
+            else:
+                results[item["idx"]] = self._finish_review(item["idx"], item["url"], review)
+        return results
+
+    def _iter_batched(self, repo: str, local_repo_path: str, items: List[Tuple[int, Dict[str, Any]]],
+                      advance: Callable[[int], None],
+                      skipped: Optional[Set[int]] = None) -> Iterator[Tuple[int, Optional[Tuple[Dict[str, Any], float]]]]:
+        """
+        Готовить коммиты параллельно и раскладывать мелкие по пачкам по мере готовности.
+
+        Заполненная пачка сразу уходит на ревью, пока остальные коммиты ещё готовятся,
+        а крупные коммиты ревьюятся по одному. Пачка из одного коммита ничем не лучше
+        отдельного запроса, поэтому такой остаток тоже отправляется отдельно.
+        :param skipped: Сюда добавляются позиции коммитов, пропущенных из-за пустого diff'а
+        :return: Пары (позиция коммита в items, ревью) в порядке готовности
+        """
+        overhead = estimate_tokens(self.prompt_generator.get_batch_review_prompt([]))
+        positions = {idx: position for position, (idx, _) in enumerate(items)}
+        current = []
+        current_tokens = overhead
+        counts = {"batches": 0, "singles": 0}
+
+        prepare_executor = ThreadPoolExecutor(max_workers=self.prepare_workers)
+        review_executor = ThreadPoolExecutor(max_workers=self.review_workers)
+
+        def submit(group: List[Dict[str, Any]]) -> Future:
+            if len(group) == 1:
+                counts["singles"] += 1
+                future = review_executor.submit(lambda item: {item["idx"]: self._review_prepared(item)}, group[0])
+            else:
+                counts["batches"] += 1
+                future = review_executor.submit(self._review_batch, group)
+            future.add_done_callback(
+                lambda f: advance(len(group) if not f.cancelled() and not f.exception() else 0)
+            )
+            return future
+
+        try:
+            preparing = {
+                prepare_executor.submit(self._prepare_commit, repo, local_repo_path, idx, commit): position
+                for position, (idx, commit) in enumerate(items)
+            }
+            reviewing = set()
+            while preparing or reviewing:
+                done, _ = wait(set(preparing) | reviewing, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future in reviewing:
+                        reviewing.discard(future)
+                        for idx, review in future.result().items():
+                            yield positions[idx], review
+                        continue
+
+                    position = preparing.pop(future)
+                    item = future.result()
+                    if item is None:
+                        if skipped is not None:
+                            skipped.add(position)
+                        advance(1)
+                        yield position, None
+                        continue
+                    item_tokens = self._batch_tokens(item)
+                    if item_tokens is None:
+                        reviewing.add(submit([item]))
+                        continue
+                    if current and (current_tokens + item_tokens > self.batch_token_budget
+                                    or len(current) >= self.batch_max_commits):
+                        reviewing.add(submit(current))
+                        current = []
+                        current_tokens = overhead
+                    current.append(item)
+                    current_tokens += item_tokens
+
+                if not preparing and current:
+                    reviewing.add(submit(current))
+                    current = []
+        finally:
+            prepare_executor.shutdown(wait=True, cancel_futures=True)
+            review_executor.shutdown(wait=True, cancel_futures=True)
+        print(f"Мелкие коммиты сгруппированы в {counts['batches']} пачек, отдельно: {counts['singles']}")
+
+    def _iter_pipelined(self, repo: str, local_repo_path: str, items: List[Tuple[int, Dict[str, Any]]],
+                        advance: Callable[[int], None],
+                        skipped: Optional[Set[int]] = None) -> Iterator[Tuple[int, Optional[Tuple[Dict[str, Any], float]]]]:
+        """
+        Провести каждый коммит через все стадии конвейера независимо от остальных.
+
+        :param skipped: Сюда добавляются позиции коммитов, пропущенных из-за пустого diff'а
+        :return: Пары (позиция коммита в items, ревью) в порядке готовности
+        """
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            futures = {
+                executor.submit(
+                    self._review_commit, repo, local_repo_path, idx, commit,
+                    (lambda position=position: skipped.add(position)) if skipped is not None else None
+                ): position
+                for position, (idx, commit) in enumerate(items)
+            }
+            for future in futures:
+                future.add_done_callback(lambda _: advance(1))
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    def _start_reviews(self, repo: str, local_repo_path: str, items: List[Tuple[int, Dict[str, Any]]],
+                       advance: Callable[[int], None],
+                       skipped: Optional[Set[int]] = None) -> Iterator[Tuple[int, Optional[Tuple[Dict[str, Any], float]]]]:
+        """Запустить ревью единиц одного репозитория пачками или конвейером в зависимости от настроек."""
+        if self.batch_token_budget:
+            return self._iter_batched(repo, local_repo_path, items, advance, skipped)
+        return self._iter_pipelined(repo, local_repo_path, items, advance, skipped)
+
+    def _collect_items(self, repo: str, user: str, start_date: str, end_date: str,
+                       granularity: str) -> List[Tuple[int, Dict[str, Any]]]:
+        """
+        Собрать единицы ревью: коммиты (mr_number — порядковый номер) или PR (mr_number — номер PR).
+        """
+        if granularity == "prs":
+            if self.pr_collector is None:
+                raise ValueError("Для анализа по PR нужен GitHubPRDiffCollector")
+            repo_owner, repo_name = repo.split("/")
+            prs = self.pr_collector.get_user_prs(repo_owner, repo_name, user, None, start_date, end_date)
+            print(f"Найдено PR: {len(prs)}")
+            return [(pr["number"], pr) for pr in prs]
+
+        commits = self.github_collector.get_user_commits(repo, user, start_date, end_date)
+        print(commits)
+        return list(enumerate(commits, start=1))
+
+    @staticmethod
+    def _item_identity(item: Dict[str, Any]) -> Tuple[str, str, str]:
+        """
+        Ключ, версия и дата единицы ревью для истории.
+
+        Коммит неизменен для своего SHA, а PR считается изменившимся, если у него новый updated_at.
+        """
+        if "sha" in item:
+            return item["sha"], item["sha"], item["commit"]["author"]["date"]
+        return str(item["number"]), item.get("updated_at") or "", item.get("created_at") or ""
+
+    def _collect_new_items(self, repo: str, user: str, start_date: str, end_date: str,
+                           granularity: str) -> Tuple[List[Tuple[int, Dict[str, Any]]], List[Tuple[Dict[str, Any], float]],
+                                                      Optional[Tuple[str, str]]]:
+        """
+        Собрать только ещё не отревьюенные единицы и сохранённые результаты за период.
+
+        Если начало периода попадает в уже покрытый историей период, коммиты запрашиваются
+        с даты водяного знака, иначе — с начала периода; граничные коммиты, которые придут
+        повторно, отсекаются по SHA.
+        :return: Новые единицы ревью, ранее сохранённые пары (ревью, оценка) и (ключ, дата)
+            самой поздней из полученных единиц, включая уже известные (None, если единиц нет)
+        """
+        if self.history is None:
+            raise ValueError("Для инкрементального анализа нужна история ревью")
+        fetch_start = start_date
+        watermark = self.history.get_watermark(repo, user, granularity)
+        if granularity == "commits" and watermark is not None and watermark["covered_from"] is not None \
+                and (start_date or "") >= watermark["covered_from"]:
+            fetch_start = max(start_date or "", watermark["item_date"][:10])
+        if end_date and fetch_start and fetch_start > end_date:
+            items = []
+        else:
+            items = self._collect_items(repo, user, fetch_start, end_date, granularity)
+        latest = max(
+            ((key, item_date) for key, _, item_date in (self._item_identity(item) for _, item in items)),
+            key=lambda identity: identity[1], default=None
+        )
+
+        known = self.history.known_versions(repo, user, granularity)
+        items = [
+            (number, item) for number, item in items
+            if known.get(self._item_identity(item)[0]) != self._item_identity(item)[1]
+        ]
+        if granularity == "commits":
+            # Новые коммиты нумеруются после уже сохранённых
+            items = [(len(known) + i, item) for i, (_, item) in enumerate(items, start=1)]
+        print(f"Новых единиц ревью: {len(items)}, ранее обработано: {len(known)}")
+
+        previous = self.history.results(
+            repo, user, granularity, start_date, end_date,
+            exclude=[self._item_identity(item)[0] for _, item in items]
+        )
+        return items, previous, latest
+
+    def _save_review(self, repo: str, user: str, granularity: str, item: Dict[str, Any],
+                     review: Tuple[Dict[str, Any], float]):
+        item_key, version, item_date = self._item_identity(item)
+        parsed, score = review
+        self.history.save(repo, user, granularity, item_key, version, item_date, parsed, score)
+
+    def _save_history(self, repo: str, user: str, granularity: str,
+                      items: List[Tuple[int, Dict[str, Any]]],
+                      reviews: Iterator[Tuple[int, Optional[Tuple[Dict[str, Any], float]]]]
+                      ) -> Iterator[Tuple[int, Optional[Tuple[Dict[str, Any], float]]]]:
+        """
+        Сохранять готовые ревью обычного анализа в историю, не трогая покрытый период.
+
+        По истории строится статистика, а следующий инкрементальный запуск не ревьюит их заново.
+        """
+        for position, review in reviews:
+            if review is not None:
+                self._save_review(repo, user, granularity, items[position][1], review)
+            yield position, review
+
+    @staticmethod
+    def _touches_covered(start_date: str, end_date: Optional[str], watermark: Dict[str, Any]) -> bool:
+        """Пересекается ли период [start_date, end_date] с покрытым историей или примыкает к нему слева."""
+        covered_from = watermark["covered_from"]
+        if start_date > watermark["item_date"][:10]:
+            return False
+        if not end_date or not covered_from:
+            return True
+        return end_date >= (date.fromisoformat(covered_from) - timedelta(days=1)).isoformat()
+
+    def _record_history(self, repo: str, user: str, granularity: str,
+                        start_date: str, end_date: str,
+                        items: List[Tuple[int, Dict[str, Any]]],
+                        reviews: Iterator[Tuple[int, Optional[Tuple[Dict[str, Any], float]]]],
+                        skipped: Set[int],
+                        latest: Optional[Tuple[str, str]]) -> Iterator[Tuple[int, Optional[Tuple[Dict[str, Any], float]]]]:
+        """
+        Сохранять каждое готовое ревью в историю и обновить покрытый период после полного прохода.
+
+        Если часть ревью не удалась из-за модели или разбора ответа, водяной знак останавливается
+        на самой ранней из них, чтобы следующий запуск запросил эти коммиты снова. Коммиты,
+        пропущенные из-за пустого diff'а, считаются обработанными.
+        :param skipped: Позиции единиц, пропущенных из-за пустого diff'а
+        :param latest: (ключ, дата) самой поздней единицы периода, включая уже известные истории:
+            если ошибок нет, водяной знак доходит до неё, даже когда заново ревьюились только старые единицы
+        """
+        identities = [self._item_identity(item) for _, item in items]
+        failed_dates = []
+        for position, review in reviews:
+            item_key, version, item_date = identities[position]
+            if review is not None:
+                parsed, score = review
+                self.history.save(repo, user, granularity, item_key, version, item_date, parsed, score)
+            elif position not in skipped:
+                failed_dates.append(item_date)
+            yield position, review
+
+        item_key = item_date = None
+        if failed_dates:
+            item_date = min(failed_dates)
+            item_key = next(key for key, _, identity_date in identities if identity_date == item_date)
+        else:
+            candidates = [(key, identity_date) for key, _, identity_date in identities]
+            if latest is not None:
+                candidates.append(latest)
+            if candidates:
+                item_key, item_date = max(candidates, key=lambda identity: identity[1])
+
+        covered_from = start_date or ""
+        watermark = self.history.get_watermark(repo, user, granularity)
+        if watermark is not None and watermark["covered_from"] is not None:
+            if self._touches_covered(covered_from, end_date, watermark):
+                # Периоды сливаются в один, водяной знак сдвигается вперёд или останавливается на ошибке
+                covered_from = min(covered_from, watermark["covered_from"])
+                if item_date is None or (not failed_dates and item_date < watermark["item_date"]):
+                    item_key, item_date = watermark["item_key"], watermark["item_date"]
+            elif covered_from < watermark["covered_from"]:
+                # Период целиком раньше покрытого и не примыкает к нему: покрытие остаётся прежним
+                return
+        if item_date is not None:
+            self.history.set_watermark(repo, user, granularity, item_key, item_date, covered_from)
+
+    def _iter_reviews(self, repo: str, user: str, local_repo_path: str,
+                      start_date: str, end_date: str,
+                      progress: Optional[Callable[[str, int, int], None]],
+                      granularity: str, incremental: bool = False
+                      ) -> Tuple[int, Iterator[Tuple[int, Optional[Tuple[Dict[str, Any], float]]]], List[Tuple[Dict[str, Any], float]]]:
+        """
+        Собрать единицы ревью и запустить их обработку.
+
+        :param incremental: Ревьюить только то, чего ещё нет в истории
+        :return: Число единиц ревью, итератор пар (позиция, ревью) в порядке готовности
+            и ранее сохранённые пары (ревью, оценка) за период (только в инкрементальном режиме)
+        """
+        if granularity not in ("commits", "prs"):
+            raise ValueError(f"Неизвестный режим анализа: {granularity}")
+        if progress:
+            progress("collecting", 0, 0)
+        previous = []
+        latest = None
+        if incremental:
+            items, previous, latest = self._collect_new_items(repo, user, start_date, end_date, granularity)
+        else:
+            items = self._collect_items(repo, user, start_date, end_date, granularity)
+
+        total_commits = len(items)
+        done_commits = 0
+        done_lock = threading.Lock()
+
+        def advance(count: int):
+            nonlocal done_commits
+            with done_lock:
+                done_commits += count
+                done = done_commits
+            if progress and count:
+                progress("reviewing", done, total_commits)
+
+        if progress:
+            progress("reviewing", 0, total_commits)
+
+        skipped = set()
+        reviews = self._start_reviews(repo, local_repo_path, items, advance, skipped)
+        if incremental:
+            reviews = self._record_history(
+                repo, user, granularity, start_date, end_date, items, reviews, skipped, latest
+            )
+        elif self.history is not None:
+            reviews = self._save_history(repo, user, granularity, items, reviews)
+        return total_commits, reviews, previous
+
+    @staticmethod
+    def _build_metadata(repo: str, user: str, start_date: str, end_date: str,
+                        granularity: str, mean_score: float, total: int) -> Dict[str, Any]:
+        return {
+            "repo": repo,
+            "user": user,
+            "mean_score": mean_score,
+            "granularity": granularity,
+            "period": {
+                "start": start_date,
+                "end": end_date
+            },
+            "total": total
+        }
+
+    def iter_analyze(self, repo: str, user: str, local_repo_path: str,
+                     start_date: str, end_date: str,
+                     progress: Optional[Callable[[str, int, int], None]] = None,
+                     granularity: str = "commits",
+                     incremental: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Потоковый вариант analyze: отдаёт ревью по мере готовности, не накапливая их.
+
+        Сначала идут записи {"type": "result", "review", "mean_score", "done", "total"}, где mean_score —
+        средняя оценка по уже готовым ревью, затем одна запись {"type": "metadata", "metadata"}
+        с итоговыми метаданными, как в analyze. В инкрементальном режиме первыми идут
+        сохранённые ранее результаты за период (с done == 0).
+        """
+        total_items, reviews, previous = self._iter_reviews(
+            repo, user, local_repo_path, start_date, end_date, progress, granularity, incremental
+        )
+        scores = {}
+        running_score = 0.
+        for offset, (parsed, score) in enumerate(previous):
+            scores[total_items + offset] = score
+            running_score += score
+            yield {
+                "type": "result",
+                "review": parsed,
+                "mean_score": running_score / len(scores),
+                "done": 0,
+                "total": total_items
+            }
+
+        done = 0
+        for position, review in reviews:
+            done += 1
+            if review is None:
+                continue
+            parsed, score = review
+            scores[position] = score
+            running_score += score
+            yield {
+                "type": "result",
+                "review": parsed,
+                "mean_score": running_score / len(scores),
+                "done": done,
+                "total": total_items
+            }
+
+        # Итоговая средняя считается в исходном порядке коммитов, как в analyze
+        mean_score = 0
+        for position in sorted(scores):
+            mean_score += scores[position]
+        total = len(scores)
+        mean_score = mean_score / total if total > 0 else 0
+        yield {
+            "type": "metadata",
+            "metadata": self._build_metadata(repo, user, start_date, end_date, granularity, mean_score, total)
+        }
+
+    def analyze(self, repo: str, user: str, local_repo_path: str,
+                start_date: str, end_date: str,
+                progress: Optional[Callable[[str, int, int], None]] = None,
+                granularity: str = "commits",
+                incremental: bool = False) -> Dict[str, Any]:
+        """
+        Основной метод анализа.
+
+        :param progress: Необязательный callback (stage, done, total) для отслеживания хода анализа
+        :param granularity: "commits" — ревью каждого коммита, "prs" — ревью итогового diff'а каждого PR
+        :param incremental: Ревьюить только коммиты/PR, которых ещё нет в истории, и объединить
+            их с сохранёнными результатами за период
+        """
+        total_items, completed, previous = self._iter_reviews(
+            repo, user, local_repo_path, start_date, end_date, progress, granularity, incremental
+        )
+        # Результаты собираются в исходном порядке коммитов, сохранённые ранее (они старше) — после них
+        reviews = [None] * total_items
+        for position, review in completed:
+            reviews[position] = review
+        reviews.extend(previous)
+
+        results = []
+        mean_score = 0
+        for review in reviews:
+            if review is None:
+                continue
+            parsed, score = review
+            mean_score+=score
+            results.append(parsed)
         total = len(results)
         
         if total > 0:
@@ -171,15 +901,162 @@ class MergeRequestAnalyzer:
           mean_score=0
 
         return {
-            "metadata": {
-                "repo": repo,
-                "user": user,
-                "mean_score": mean_score,
+            "metadata": self._build_metadata(repo, user, start_date, end_date, granularity, mean_score, total),
+            "results": results
+        }
+
+    @staticmethod
+    def _summarize_scores(scores: List[float]) -> Dict[str, Any]:
+        return {
+            "total": len(scores),
+            "mean_score": sum(scores) / len(scores) if scores else 0
+        }
+
+    @classmethod
+    def _summarize_unique(cls, keys: Iterable[str],
+                          review_for: Callable[[str], Optional[Tuple[Dict[str, Any], float]]]) -> Dict[str, Any]:
+        """Итоги по уникальным единицам ревью: каждый ключ учитывается один раз."""
+        reviews = (review_for(key) for key in keys)
+        return cls._summarize_scores([review[1] for review in reviews if review is not None])
+
+    def analyze_many(self, repos: List[str], users: List[str], start_date: str, end_date: str,
+                     local_repo_paths: Optional[Dict[str, str]] = None,
+                     progress: Optional[Callable[[str, int, int], None]] = None,
+                     granularity: str = "commits") -> Dict[str, Any]:
+        """
+        Анализ команды: все пары репозиторий × пользователь за один проход.
+
+        Единицы ревью всех пар собираются заранее, и каждый коммит (по SHA) или PR ревьюится
+        один раз, даже если попадает в несколько пар (например, в форк и исходный репозиторий).
+        Все пары используют общие ограничения стадий, поэтому REVIEW_WORKERS ограничивает
+        число одновременных запросов к модели для всей команды.
+        :param local_repo_paths: Пути к локальным копиям по имени репозитория (для поиска применений)
+        :return: Отчёты по каждой паре в формате analyze и сводка по команде
+        """
+        if granularity not in ("commits", "prs"):
+            raise ValueError(f"Неизвестный режим анализа: {granularity}")
+        local_repo_paths = local_repo_paths or {}
+        targets = [(repo, user) for repo in repos for user in users]
+        if progress:
+            progress("collecting", 0, 0)
+
+        def collect(target: Tuple[str, str]) -> List[Tuple[int, Dict[str, Any]]]:
+            repo, user = target
+            return self._collect_items(repo, user, start_date, end_date, granularity)
+
+        collected = {}
+        errors = {}
+        with ThreadPoolExecutor(max_workers=self.prepare_workers) as executor:
+            futures = {executor.submit(collect, target): target for target in targets}
+            for future in as_completed(futures):
+                try:
+                    collected[futures[future]] = future.result()
+                except Exception as e:
+                    print(f"Не удалось собрать коммиты {futures[future]}: {e}")
+                    errors[futures[future]] = str(e)
+
+        # Уникальные единицы ревью по репозиториям; ключ коммита — SHA, PR — репозиторий и номер
+        unique_items: Dict[str, List[Tuple[int, Dict[str, Any]]]] = {}
+        unique_keys: Dict[str, Tuple[str, int]] = {}
+        items_by_key: Dict[str, Dict[str, Any]] = {}
+        target_keys: Dict[Tuple[str, str], List[str]] = {}
+        for target in targets:
+            repo, _ = target
+            target_keys[target] = []
+            for _, item in collected.get(target, []):
+                key = item["sha"] if "sha" in item else f"{repo}#{item['number']}"
+                target_keys[target].append(key)
+                if key in unique_keys:
+                    continue
+                repo_items = unique_items.setdefault(repo, [])
+                number = len(repo_items) + 1 if granularity == "commits" else item["number"]
+                unique_keys[key] = (repo, len(repo_items))
+                items_by_key[key] = item
+                repo_items.append((number, item))
+
+        total_items = len(unique_keys)
+        duplicates = sum(len(keys) for keys in target_keys.values()) - total_items
+        print(f"Уникальных единиц ревью: {total_items}, повторов между парами: {duplicates}")
+
+        done_items = 0
+        done_lock = threading.Lock()
+
+        def advance(count: int):
+            nonlocal done_items
+            with done_lock:
+                done_items += count
+                done = done_items
+            if progress and count:
+                progress("reviewing", done, total_items)
+
+        if progress:
+            progress("reviewing", 0, total_items)
+
+        def review_repo(repo: str) -> Dict[int, Optional[Tuple[Dict[str, Any], float]]]:
+            reviews = self._start_reviews(repo, local_repo_paths.get(repo, LOCAL_REPO_PATH), unique_items[repo], advance)
+            return dict(reviews)
+
+        reviews_by_repo = {}
+        if unique_items:
+            with ThreadPoolExecutor(max_workers=len(unique_items)) as executor:
+                futures = {executor.submit(review_repo, repo): repo for repo in unique_items}
+                for future in as_completed(futures):
+                    reviews_by_repo[futures[future]] = future.result()
+
+        def review_for(key: str) -> Optional[Tuple[Dict[str, Any], float]]:
+            review_repo_name, position = unique_keys[key]
+            return reviews_by_repo[review_repo_name].get(position)
+
+        reports = []
+        # Итоги по пользователям и репозиториям считаются по уникальным единицам, как и по команде
+        keys_by_user: Dict[str, Set[str]] = {user: set() for user in users}
+        keys_by_repo: Dict[str, Set[str]] = {repo: set() for repo in repos}
+        for target in targets:
+            repo, user = target
+            results = []
+            scores = []
+            for key in target_keys[target]:
+                keys_by_user[user].add(key)
+                keys_by_repo[repo].add(key)
+                review = review_for(key)
+                if review is None:
+                    continue
+                if self.history is not None:
+                    # Ревью сохраняется для каждой пары, в которую попал коммит
+                    self._save_review(repo, user, granularity, items_by_key[key], review)
+                parsed, score = review
+                results.append(parsed)
+                scores.append(score)
+            summary = self._summarize_scores(scores)
+            report = {
+                "metadata": self._build_metadata(
+                    repo, user, start_date, end_date, granularity, summary["mean_score"], summary["total"]
+                ),
+                "results": results
+            }
+            if target in errors:
+                report["error"] = errors[target]
+            reports.append(report)
+
+        team_scores = [
+            review[1]
+            for repo_reviews in reviews_by_repo.values()
+            for review in repo_reviews.values()
+            if review is not None
+        ]
+        return {
+            "team": {
+                "repos": repos,
+                "users": users,
+                "granularity": granularity,
                 "period": {
                     "start": start_date,
                     "end": end_date
                 },
-                "total": total
+                **self._summarize_scores(team_scores),
+                "duplicates": duplicates,
+                "by_user": {user: self._summarize_unique(keys, review_for) for user, keys in keys_by_user.items()},
+                "by_repo": {repo: self._summarize_unique(keys, review_for) for repo, keys in keys_by_repo.items()}
             },
-            "results": results
+            "reports": reports
         }
@@ -0,0 +1,13 @@
+import random
+
+
+def backoff_delay(attempt: int, backoff_factor: float, max_backoff: float) -> float:
+    """
+    Экспоненциальная задержка с джиттером перед повтором запроса.
+
+    :param attempt: Номер попытки, начиная с 0
+    :param backoff_factor: Базовая задержка в секундах
+    :param max_backoff: Максимальная задержка до джиттера
+    """
+    delay = min(max_backoff, backoff_factor * 2 ** attempt)
+    return delay * (0.5 + random.random() / 2)
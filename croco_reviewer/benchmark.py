@@ -0,0 +1,420 @@
+"""
+Офлайн-бенчмарк конвейера анализа.
+
+GitHub API подменяется записанными ответами (или синтетическими, сгенерированными
+под нужный размер), модель — фейковой с настраиваемой задержкой, локальный репозиторий —
+синтетическим деревом файлов. Печатает время по стадиям и общую пропускную способность,
+чтобы регрессии в горячих путях были видны до выката.
+
+Пример:
+    python benchmark.py --files 1000,10000 --commits 100,1000 --llm-latency 0.05 --json bench.json
+"""
+import argparse
+import functools
+import json
+import os
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Any, Callable, Tuple
+from urllib.parse import urlsplit, parse_qsl
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import analyzers
+from aggregates import summarize
+from analyzers import MergeRequestAnalyzer, CodeReviewPrompts, YandexGPTReviewer
+from diffs_collectors import GitHubDiffsCollector
+from github_client import GitHubClient
+from otchets_former import MRReportRenderer
+
+BENCH_REPO = "bench/repo"
+BENCH_USER = "bench-user"
+
+
+def _fixture_key(url: str) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+    """Ключ ответа: путь и отсортированные query-параметры, независимо от их порядка в URL."""
+    parts = urlsplit(url)
+    return parts.path, tuple(sorted(parse_qsl(parts.query)))
+
+
+class ReplayAdapter(HTTPAdapter):
+    """Транспорт requests, отдающий записанные ответы GitHub API вместо сетевых запросов."""
+
+    def __init__(self, fixtures: List[Dict[str, Any]]):
+        super().__init__()
+        self.responses = {_fixture_key(fixture["url"]): fixture for fixture in fixtures}
+
+    def send(self, request, **kwargs):
+        fixture = self.responses.get(_fixture_key(request.url))
+        response = requests.Response()
+        response.request = request
+        response.url = request.url
+        if fixture is None:
+            response.status_code = 404
+            response._content = b'{"message": "Not Found (no fixture)"}'
+            return response
+        response.status_code = fixture.get("status", 200)
+        response.headers.update(fixture.get("headers", {}))
+        response._content = json.dumps(fixture["body"]).encode("utf-8")
+        return response
+
+
+class RecordingAdapter(HTTPAdapter):
+    """Транспорт requests, который сохраняет реальные ответы GitHub API для последующего воспроизведения."""
+
+    def __init__(self):
+        super().__init__()
+        self.fixtures = []
+        self._lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        response = super().send(request, **kwargs)
+        if response.status_code == 200:
+            with self._lock:
+                self.fixtures.append({
+                    "url": request.url,
+                    "status": response.status_code,
+                    "headers": {name: value for name, value in response.headers.items() if name == "Link"},
+                    "body": response.json()
+                })
+        return response
+
+
+class FakeModel:
+    """Фейковая модель YCloudML: валидное ревью на каждый запрос после заданной задержки."""
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.2, malformed_rate: float = 0.,
+                 seed: int = 0):
+        """
+        :param latency: Средняя задержка ответа в секундах
+        :param jitter: Разброс задержки (доля от latency)
+        :param malformed_rate: Доля ответов с лишним текстом без JSON (для проверки пути исправления)
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.malformed_rate = malformed_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _review(self, mr_number: int) -> Dict[str, Any]:
+        with self._lock:
+            problems = self._random.randint(0, 3)
+        return {
+            "mr_number": mr_number,
+            "url": "",
+            "complexity": "SML"[mr_number % 3],
+            "problems": {
+                "minor": [{"type": "Стиль", "description": "Синтетическая проблема", "lines": [1]}] * problems,
+                "regular": [],
+                "critical": []
+            },
+            "antipatterns": [],
+            "positives": [{"aspect": "Синтетический плюс", "lines": None}],
+            "impacts": []
+        }
+
+    def run(self, messages: List[Dict[str, str]]):
+        prompt = messages[-1]["text"]
+        with self._lock:
+            delay = self.latency * (1 + self._random.uniform(-self.jitter, self.jitter))
+            malformed = self._random.random() < self.malformed_rate
+        time.sleep(max(delay, 0.))
+
+        batch_numbers = [int(n) for n in re.findall(r"=== КОММИТ MR #(\d+)", prompt)]
+        if batch_numbers:
+            text = json.dumps([self._review(n) for n in batch_numbers], ensure_ascii=False)
+        else:
+            match = re.search(r'"mr_number": (\d+)', prompt)
+            text = json.dumps(self._review(int(match.group(1)) if match else 0), ensure_ascii=False)
+        if malformed and "не удалось разобрать" not in prompt:
+            text = "Вот ревью, но без JSON."
+        return _FakeResult(text, SimpleNamespace(total_tokens=len(prompt) // 3 + len(text) // 3))
+
+
+class _FakeResult(list):
+    """Результат в форме ответа SDK: result[0].text и result.usage."""
+
+    def __init__(self, text: str, usage: SimpleNamespace):
+        super().__init__([SimpleNamespace(text=text)])
+        self.usage = usage
+
+
+class StageTimer:
+    """Время вызовов по стадиям; стадии оборачивают методы конкретных объектов бенчмарка."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.samples: Dict[str, List[float]] = {}
+
+    def wrap(self, stage: str, func: Callable) -> Callable:
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - started
+                with self._lock:
+                    self.samples.setdefault(stage, []).append(elapsed)
+        return timed
+
+    def instrument(self, obj: Any, method: str, stage: str):
+        setattr(obj, method, self.wrap(stage, getattr(obj, method)))
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        """Для каждой стадии: число вызовов, суммарное время и перцентили одного вызова (в секундах)."""
+        with self._lock:
+            return {
+                stage: {"calls": len(samples), "total": sum(samples), **summarize(samples, (50, 95))}
+                for stage, samples in self.samples.items()
+            }
+
+
+def make_repo(path: str, files: int, seed: int = 0) -> List[str]:
+    """
+    Создать синтетический репозиторий из files Python-файлов.
+
+    :return: Идентификаторы, определённые в репозитории (их меняют синтетические коммиты)
+    """
+    rng = random.Random(seed)
+    per_dir = 200
+    identifiers = []
+    for i in range(files):
+        directory = os.path.join(path, f"pkg_{i // per_dir}")
+        os.makedirs(directory, exist_ok=True)
+        helper = f"helper_{rng.randrange(max(files // 10, 1))}"
+        identifiers.append(f"func_{i}")
+        with open(os.path.join(directory, f"module_{i}.py"), "w", encoding="utf-8") as f:
+            f.write(
+                f"from pkg_0.module_0 import {helper}\n\n\n"
+                f"class Service{i}:\n"
+                f"    def func_{i}(self, value):\n"
+                f"        result = {helper}(value)\n"
+                f"        return result + CONST_{i % 50}\n\n\n"
+                f"def {helper}(value):\n"
+                f"    return value * {i}\n"
+                + "".join(f"\n# filler line {n} for module {i}\n" for n in range(20))
+            )
+    return identifiers
+
+
+def make_github_fixtures(commits: int, identifiers: List[str], start_date: str, end_date: str,
+                         seed: int = 0) -> List[Dict[str, Any]]:
+    """Синтетические ответы GitHub API: постраничный список коммитов и данные каждого коммита."""
+    rng = random.Random(seed)
+    shas = [f"{rng.getrandbits(160):040x}" for _ in range(commits)]
+    list_url = f"https://api.github.com/repos/{BENCH_REPO}/commits"
+    params = {
+        "author": BENCH_USER,
+        "per_page": "100",
+        "since": f"{start_date}T00:00:00Z",
+        "until": f"{end_date}T23:59:59Z"
+    }
+    fixtures = []
+    pages = [shas[i:i + 100] for i in range(0, len(shas), 100)] or [[]]
+    for page_no, page in enumerate(pages, start=1):
+        page_params = params if page_no == 1 else {**params, "page": str(page_no)}
+        headers = {}
+        if page_no < len(pages):
+            next_query = "&".join(f"{k}={v}" for k, v in {**params, "page": str(page_no + 1)}.items())
+            headers["Link"] = f'<{list_url}?{next_query}>; rel="next"'
+        fixtures.append({
+            "url": f"{list_url}?{'&'.join(f'{k}={v}' for k, v in page_params.items())}",
+            "headers": headers,
+            "body": [
+                {"sha": sha, "commit": {"author": {"date": f"{start_date}T12:00:00Z"}, "message": "bench"}}
+                for sha in page
+            ]
+        })
+
+    for sha in shas:
+        files = []
+        for _ in range(rng.randint(1, 5)):
+            ident = rng.choice(identifiers)
+            module = ident.split("_")[1]
+            added = "\n".join(
+                f"+        value_{n} = {rng.choice(identifiers)}(value)" for n in range(rng.randint(2, 30))
+            )
+            files.append({
+                "filename": f"pkg_{int(module) // 200}/module_{module}.py",
+                "patch": f"@@ -5,3 +5,4 @@ class Service{module}:\n     def {ident}(self, value):\n"
+                         f"-        result = old(value)\n{added}\n         return result"
+            })
+        fixtures.append({
+            "url": f"https://api.github.com/repos/{BENCH_REPO}/commits/{sha}",
+            "body": {"sha": sha, "html_url": f"https://github.com/{BENCH_REPO}/commit/{sha}", "files": files}
+        })
+    return fixtures
+
+
+def run_benchmark(files: int, commits: int, llm_latency: float = 0.05, malformed_rate: float = 0.,
+                  usage_mode: str = "index", batch_token_budget: int = 0,
+                  fixtures: Optional[List[Dict[str, Any]]] = None, repo_path: Optional[str] = None,
+                  repo: str = BENCH_REPO, user: str = BENCH_USER,
+                  start_date: str = "2024-01-01", end_date: str = "2024-12-31",
+                  seed: int = 0) -> Dict[str, Any]:
+    """
+    Один прогон анализа на синтетических (или записанных) данных.
+
+    :param fixtures: Записанные ответы GitHub API; без них генерируются синтетические на commits коммитов
+    :param repo_path: Готовый локальный репозиторий; без него генерируется синтетический на files файлов
+    :param repo: Репозиторий и пользователь, для которых записаны fixtures
+    :return: Параметры прогона, время по стадиям и общая пропускная способность
+    """
+    workdir = tempfile.mkdtemp(prefix="croco_bench_")
+    try:
+        started = time.perf_counter()
+        if repo_path is None:
+            repo_path = os.path.join(workdir, "repo")
+            identifiers = make_repo(repo_path, files, seed)
+        else:
+            identifiers = [f"func_{i}" for i in range(max(files, 1))]
+        if fixtures is None:
+            fixtures = make_github_fixtures(commits, identifiers, start_date, end_date, seed)
+        else:
+            commits = sum(len(fixture["body"]) for fixture in fixtures if isinstance(fixture["body"], list))
+        setup_seconds = time.perf_counter() - started
+
+        client = GitHubClient(max_retries=0)
+        client.session.mount("https://", ReplayAdapter(fixtures))
+        collector = GitHubDiffsCollector(client=client, usage_mode=usage_mode)
+        prompts = CodeReviewPrompts()
+        # Клиент SDK создаётся без обращения к сети, а модель подменяется фейковой
+        reviewer = YandexGPTReviewer("bench", "bench", model_name="fake", model_version="bench", max_retries=0)
+        reviewer.model = FakeModel(llm_latency, malformed_rate=malformed_rate, seed=seed)
+
+        timer = StageTimer()
+        timer.instrument(collector, "get_user_commits", "commit_listing")
+        timer.instrument(collector, "get_commit_diff", "diff_fetch")
+        timer.instrument(collector, "extract_changed_identifiers", "extract_identifiers")
+        timer.instrument(collector, "find_usages", "find_usages")
+        timer.instrument(prompts, "get_review_prompts", "prompt_build")
+        timer.instrument(prompts, "get_batch_review_prompt", "prompt_build")
+        timer.instrument(reviewer, "_call_model", "llm")
+
+        analyzer = MergeRequestAnalyzer(collector, prompts, reviewer, batch_token_budget=batch_token_budget)
+        original_parse = analyzers.parse_review, analyzers.parse_batch_reviews
+        analyzers.parse_review = timer.wrap("parse", analyzers.parse_review)
+        analyzers.parse_batch_reviews = timer.wrap("parse", analyzers.parse_batch_reviews)
+        try:
+            started = time.perf_counter()
+            report = analyzer.analyze(repo, user, repo_path, start_date, end_date)
+            analyze_seconds = time.perf_counter() - started
+        finally:
+            analyzers.parse_review, analyzers.parse_batch_reviews = original_parse
+
+        report_path = os.path.join(workdir, "report.json")
+        with open(report_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False)
+        renderer = MRReportRenderer(report_path)
+        timer.instrument(renderer, "save_html", "render")
+        renderer.save_html(os.path.join(workdir, "report.html"))
+
+        reviewed = report["metadata"]["total"]
+        return {
+            "files": files,
+            "commits": commits,
+            "usage_mode": usage_mode,
+            "batch_token_budget": batch_token_budget,
+            "llm_latency": llm_latency,
+            "setup_seconds": setup_seconds,
+            "analyze_seconds": analyze_seconds,
+            "reviewed": reviewed,
+            "commits_per_second": reviewed / analyze_seconds if analyze_seconds else 0.,
+            "stages": timer.report()
+        }
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def format_result(result: Dict[str, Any]) -> str:
+    lines = [
+        f"files={result['files']} commits={result['commits']} usage_mode={result['usage_mode']} "
+        f"batch={result['batch_token_budget']} llm_latency={result['llm_latency']}s",
+        f"  анализ: {result['analyze_seconds']:.2f} с, отревьюено {result['reviewed']}, "
+        f"{result['commits_per_second']:.1f} коммитов/с (подготовка данных {result['setup_seconds']:.2f} с)",
+        f"  {'стадия':<22}{'вызовов':>9}{'всего, с':>11}{'p50, мс':>10}{'p95, мс':>10}{'max, мс':>10}"
+    ]
+    for stage, stats in result["stages"].items():
+        lines.append(
+            f"  {stage:<22}{stats['calls']:>9}{stats['total']:>11.3f}"
+            f"{stats['p50'] * 1000:>10.2f}{stats['p95'] * 1000:>10.2f}{stats['max'] * 1000:>10.2f}"
+        )
+    return "\n".join(lines)
+
+
+def record_fixtures(repo: str, user: str, start_date: str, end_date: str, output_path: str,
+                    github_token: Optional[str] = None):
+    """Записать реальные ответы GitHub API по коммитам пользователя для офлайн-прогонов."""
+    adapter = RecordingAdapter()
+    client = GitHubClient(github_token)
+    client.session.mount("https://", adapter)
+    collector = GitHubDiffsCollector(github_token, client=client)
+    for commit in collector.get_user_commits(repo, user, start_date, end_date):
+        collector.get_commit_diff(repo, commit["sha"])
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(adapter.fixtures, f, ensure_ascii=False)
+    print(f"Записано ответов: {len(adapter.fixtures)} в {output_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Офлайн-бенчмарк конвейера анализа")
+    parser.add_argument("--files", default="1000", help="Размеры синтетического репозитория через запятую")
+    parser.add_argument("--commits", default="100", help="Число синтетических коммитов через запятую")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="Задержка фейковой модели, с")
+    parser.add_argument("--malformed-rate", type=float, default=0., help="Доля ответов модели без JSON")
+    parser.add_argument("--usage-mode", default="index", choices=GitHubDiffsCollector.usage_modes)
+    parser.add_argument("--batch-token-budget", type=int, default=0)
+    parser.add_argument("--fixtures", help="Файл с записанными ответами GitHub API (вместо синтетических); "
+                                           "--start-date и --end-date должны совпадать с записью")
+    parser.add_argument("--repo-path", help="Локальный репозиторий (вместо синтетического)")
+    parser.add_argument("--start-date", default="2024-01-01")
+    parser.add_argument("--end-date", default="2024-12-31")
+    parser.add_argument("--record", metavar="OWNER/REPO:USER",
+                        help="Записать ответы GitHub API в файл --fixtures вместо прогона")
+    parser.add_argument("--json", help="Сохранить результаты в JSON для сравнения между прогонами")
+    args = parser.parse_args()
+
+    if args.record:
+        if not args.fixtures:
+            parser.error("--record требует --fixtures")
+        repo, user = args.record.split(":", 1)
+        record_fixtures(repo, user, args.start_date, args.end_date, args.fixtures, os.getenv("GITHUB_KEY"))
+        return
+
+    fixtures = None
+    if args.fixtures:
+        with open(args.fixtures, "r", encoding="utf-8") as f:
+            fixtures = json.load(f)
+        # Репозиторий и пользователь берутся из записанного запроса списка коммитов
+        list_url = next(fixture["url"] for fixture in fixtures if "author=" in fixture["url"])
+        repo = re.search(r"/repos/([^/]+/[^/]+)/commits", list_url).group(1)
+        user = dict(parse_qsl(urlsplit(list_url).query))["author"]
+    else:
+        repo, user = BENCH_REPO, BENCH_USER
+
+    results = []
+    for files in (int(value) for value in args.files.split(",")):
+        for commits in (int(value) for value in args.commits.split(",")):
+            result = run_benchmark(
+                files, commits, llm_latency=args.llm_latency, malformed_rate=args.malformed_rate,
+                usage_mode=args.usage_mode, batch_token_budget=args.batch_token_budget,
+                fixtures=fixtures, repo_path=args.repo_path, repo=repo, user=user,
+                start_date=args.start_date, end_date=args.end_date
+            )
+            print(format_result(result))
+            results.append(result)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
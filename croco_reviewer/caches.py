@@ -0,0 +1,284 @@
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Any, Callable
+
+
+class ReviewCache:
+    """
+    Персистентный кэш ответов модели в SQLite.
+
+    Ключ — хэш отрендеренного промпта и параметров модели, поэтому одинаковый
+    diff с теми же настройками не отправляется в Yandex GPT повторно.
+    """
+
+    def __init__(self, db_path: str, ttl: int = 30 * 24 * 3600, max_entries: int = 100000):
+        """
+        :param db_path: Путь к файлу SQLite
+        :param ttl: Время жизни записи в секундах (0 — без ограничения)
+        :param max_entries: Максимальное число записей; лишние вытесняются по давности использования
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS reviews (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS reviews_accessed_at ON reviews (accessed_at)")
+
+    @staticmethod
+    def make_key(prompt: str, model_name: str, model_version: str, temperature: float) -> str:
+        """Построить ключ кэша из промпта и параметров модели."""
+        payload = json.dumps([prompt, model_name, model_version, temperature], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        """Получить сохранённый ответ модели или None."""
+        now = time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute(
+                "SELECT response, created_at FROM reviews WHERE key = ?", (key,)
+            ).fetchone()
+            if row is not None and self.ttl and now - row[1] > self.ttl:
+                self._conn.execute("DELETE FROM reviews WHERE key = ?", (key,))
+                self.evictions += 1
+                row = None
+            if row is None:
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE reviews SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, response: str):
+        """Сохранить ответ модели и при необходимости вытеснить старые записи."""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO reviews (key, response, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, response, now, now)
+            )
+            if self.ttl:
+                expired = self._conn.execute(
+                    "DELETE FROM reviews WHERE created_at < ?", (now - self.ttl,)
+                ).rowcount
+                self.evictions += expired
+            overflow = self._size() - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM reviews WHERE key IN "
+                    "(SELECT key FROM reviews ORDER BY accessed_at LIMIT ?)",
+                    (overflow,)
+                )
+                self.evictions += overflow
+
+    def _size(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM reviews").fetchone()[0]
+
+    def stats(self) -> Dict[str, Any]:
+        """Счётчики попаданий/промахов и текущий размер кэша."""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": self._size(),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl
+            }
+
+
+class GitHubResponseStore:
+    """
+    Дисковое хранилище ответов GitHub API, общее для всех запросов и перезапусков.
+
+    Содержимое коммита неизменно для его SHA, поэтому коммиты хранятся бессрочно
+    по ключу repo+SHA. Списки (например, PR пользователя) меняются, поэтому
+    хранятся с коротким TTL.
+    """
+
+    def __init__(self, cache_dir: str, list_ttl: int = 600):
+        """
+        :param cache_dir: Каталог хранилища
+        :param list_ttl: Время жизни закэшированных списков в секундах
+        """
+        self.cache_dir = cache_dir
+        self.list_ttl = list_ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_full_sha(sha: str) -> bool:
+        """Кэшировать можно только полный SHA: ветки и короткие ссылки меняются."""
+        return len(sha) == 40 and all(c in "0123456789abcdef" for c in sha.lower())
+
+    def _commit_path(self, repo: str, sha: str) -> str:
+        sha = sha.lower()
+        return os.path.join(self.cache_dir, "commits", repo.lower().replace("/", "__"), sha[:2], f"{sha}.json")
+
+    def _list_path(self, key: str) -> str:
+        digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.cache_dir, "lists", f"{digest}.json")
+
+    def _read(self, path: str, ttl: Optional[int] = None) -> Optional[Any]:
+        try:
+            if ttl is not None and time.time() - os.path.getmtime(path) > ttl:
+                return None
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _write(path: str, data: Any):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Запись через временный файл, чтобы параллельные читатели не увидели половину JSON
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+    def _count(self, found: bool):
+        with self._lock:
+            if found:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get_commit(self, repo: str, sha: str) -> Optional[Dict[str, Any]]:
+        """Получить сохранённый ответ /repos/{repo}/commits/{sha} или None."""
+        data = self._read(self._commit_path(repo, sha))
+        self._count(data is not None)
+        return data
+
+    def put_commit(self, repo: str, sha: str, data: Dict[str, Any]):
+        self._write(self._commit_path(repo, sha), data)
+
+    def get_list(self, key: str) -> Optional[List[Any]]:
+        """Получить список по ключу, если он не старше list_ttl."""
+        data = self._read(self._list_path(key), ttl=self.list_ttl)
+        self._count(data is not None)
+        return data
+
+    def put_list(self, key: str, data: List[Any]):
+        self._write(self._list_path(key), data)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "list_ttl": self.list_ttl
+            }
+
+
+class RenderedReportCache:
+    """
+    Дисковый кэш отрендеренных отчётов (HTML, JSON) по ID и версии результата.
+
+    Каждый файл хранится в обычном и сжатом gzip виде, поэтому повторный просмотр
+    отчёта не требует ни рендера, ни сжатия. При появлении новой версии отчёта
+    прежние файлы того же ID удаляются.
+    """
+
+    def __init__(self, cache_dir: str, max_entries: int = 500):
+        """
+        :param cache_dir: Каталог кэша
+        :param max_entries: Максимальное число отчётов; лишние вытесняются по давности использования
+        """
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_etag(report_id: str, version: str, fmt: str) -> str:
+        digest = hashlib.sha256(f"{report_id}:{version}:{fmt}".encode("utf-8")).hexdigest()[:32]
+        return f'"{digest}"'
+
+    def _path(self, report_id: str, version: str, fmt: str) -> str:
+        digest = hashlib.sha256(version.encode("utf-8")).hexdigest()[:16]
+        return os.path.join(self.cache_dir, f"{report_id}-{digest}.{fmt}")
+
+    def lookup(self, report_id: str, version: str, fmt: str) -> Optional[str]:
+        """Путь к уже отрендеренному файлу или None; только проверка файлов, без рендера."""
+        path = self._path(report_id, version, fmt)
+        with self._lock:
+            if os.path.exists(path) and os.path.exists(f"{path}.gz"):
+                self.hits += 1
+                os.utime(path)
+                return path
+        return None
+
+    def get(self, report_id: str, version: str, fmt: str,
+            render: Callable[[str], None]) -> str:
+        """
+        Путь к отрендеренному файлу; рядом лежит его сжатая копия с суффиксом .gz.
+
+        :param render: Функция, записывающая отчёт в переданный путь (вызывается только при промахе)
+        """
+        cached = self.lookup(report_id, version, fmt)
+        if cached is not None:
+            return cached
+        path = self._path(report_id, version, fmt)
+        with self._lock:
+            self.misses += 1
+
+        # Рендер вне блокировки, чтобы большой отчёт не задерживал выдачу остальных
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        render(tmp_path)
+        with open(tmp_path, "rb") as src, gzip.open(f"{tmp_path}.gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(f"{tmp_path}.gz", f"{path}.gz")
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            current = os.path.basename(path)
+            for name in os.listdir(self.cache_dir):
+                if name.startswith(f"{report_id}-") and name.endswith((f".{fmt}", f".{fmt}.gz")) \
+                        and not name.startswith(current):
+                    os.remove(os.path.join(self.cache_dir, name))
+            self._evict()
+        return path
+
+    def _evict(self):
+        files = [
+            os.path.join(self.cache_dir, name)
+            for name in os.listdir(self.cache_dir)
+            if not name.endswith((".gz", ".tmp"))
+        ]
+        if len(files) <= self.max_entries:
+            return
+        files.sort(key=os.path.getmtime)
+        for path in files[:len(files) - self.max_entries]:
+            for stale in (path, f"{path}.gz"):
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "max_entries": self.max_entries
+            }
@@ -1,48 +1,62 @@
-import requests
 import os
 import re
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Dict, List, Tuple, Optional, Any
 
+from github_client import GitHubClient
+from usages import UsageIndex, scan_usages, parallel_scan_usages
 
 
 class GitHubDiffsCollector:
     """Класс для сбора информации о diff'ах из GitHub репозитория."""
 
-    def __init__(self, github_token: str = None):
+    usage_modes = ("index", "scan", "parallel")
+
+    def __init__(self, github_token: str = None, client: Optional[GitHubClient] = None,
+                 usage_mode: str = "index", scan_workers: Optional[int] = None):
+        self._set_usage_mode(usage_mode, scan_workers)
         self.github_token = github_token or os.getenv("GITHUB_TOKEN")
-        self.headers = {"Authorization": f"token {self.github_token}"} if self.github_token else {}
+        self.client = client or GitHubClient(self.github_token)
 
-    def get_user_commits(self, repo: str, author: str) -> List[Dict]:
-        """Получить все коммиты пользователя со всех страниц."""
-        url = f"https://api.github.com/repos/{repo}/commits"
-        all_commits = []
-        page = 1
+    def _set_usage_mode(self, usage_mode: str, scan_workers: Optional[int]):
+        if usage_mode not in self.usage_modes:
+            raise ValueError(f"Неизвестный режим поиска применений: {usage_mode}")
+        self.usage_mode = usage_mode
+        self.scan_workers = scan_workers
 
-        while True:
-            params = {
-                "author": author,
-                "per_page": 10000,  # максимум
-                "page": page
-            }
-            response = requests.get(url, params=params, headers=self.headers)
-            response.raise_for_status()
-            commits = response.json()
+    def get_user_commits(self, repo: str, author: str,
+                         start_date: Optional[str] = None,
+                         end_date: Optional[str] = None) -> List[Dict]:
+        """
+        Получить коммиты пользователя за период со всех страниц.
 
+        :param start_date: Начальная дата в формате YYYY-MM-DD (включительно)
+        :param end_date: Конечная дата в формате YYYY-MM-DD (включительно)
+        """
+        url = f"https://api.github.com/repos/{repo}/commits"
+        params = {
+            "author": author,
+            "per_page": 100  # максимум, который отдаёт GitHub
+        }
+        if start_date:
+            params["since"] = datetime.strptime(start_date, "%Y-%m-%d").strftime("%Y-%m-%dT00:00:00Z")
+        if end_date:
+            params["until"] = datetime.strptime(end_date, "%Y-%m-%d").strftime("%Y-%m-%dT23:59:59Z")
+
+        # Период фильтрует сам GitHub, поэтому страницы заканчиваются вместе с ним
+        all_commits = []
+        for commits in self.client.paginate(url, params):
             if not commits:
                 break
-
             all_commits.extend(commits)
-            page += 1
 
         return all_commits
 
     def get_commit_diff(self, repo: str, sha: str) -> Tuple[str, str]:
         """Получить diff и URL коммита."""
-        url = f"https://api.github.com/repos/{repo}/commits/{sha}"
-        response = requests.get(url, headers=self.headers)
-        response.raise_for_status()
-        commit_data = response.json()
+        commit_data = self.client.get_commit(repo, sha)
 
         diffs = []
         for file in commit_data["files"]:
@@ -61,41 +75,161 @@ class GitHubDiffsCollector:
         matches = pattern.findall(diff)
         return [name for group in matches for name in group if name]
 
-    @staticmethod
-    def find_usages(identifiers: List[str], local_repo_path: str) -> Dict[str, List[Tuple[str, int, str]]]:
-        """Найти использования идентификаторов в локальном репозитории."""
-        usage_map = {}
-        for root, _, files in os.walk(local_repo_path):
-            for file in files:
-                if file.endswith((".py", ".java", ".php")):
-                    file_path = os.path.join(root, file)
-                    try:
-                        with open(file_path, "r", encoding="utf-8") as f:
-                            lines = f.readlines()
-                        for i, line in enumerate(lines):
-                            for ident in identifiers:
-                                if ident in line:
-                                    usage_map.setdefault(ident, []).append(
-                                        (file_path, i + 1, line.strip())
-                                    )
-                    except:
-                        continue
-        return usage_map
+    def find_usages(self, identifiers: List[str], local_repo_path: str) -> Dict[str, List[Tuple[str, int, str]]]:
+        """
+        Найти использования идентификаторов в локальном репозитории.
+
+        В режиме "index" используется общий индекс токенов репозитория (совпадение целым словом),
+        в режиме "scan" — полный обход файлов, в режиме "parallel" — обход, распределённый
+        по scan_workers процессам.
+        """
+        if not identifiers or not local_repo_path:
+            return {}
+        if self.usage_mode == "index":
+            return UsageIndex.for_path(local_repo_path).find(identifiers)
+        if self.usage_mode == "parallel":
+            return parallel_scan_usages(identifiers, local_repo_path, self.scan_workers)
+        return scan_usages(identifiers, local_repo_path)
+
+
+class LocalGitDiffsCollector(GitHubDiffsCollector):
+    """
+    Сбор коммитов и diff'ов из локального клона вместо GitHub API.
+
+    Интерфейс совпадает с GitHubDiffsCollector, поэтому коллектор можно передать
+    в MergeRequestAnalyzer как есть. Строки diff'а дополняются номерами строк
+    полного файла, которые промпт просит указывать в ответе.
+    """
+
+    hunk_header = re.compile(r"^@@ -(\d+)(?:,\d+)? \+(\d+)(?:,\d+)? @@")
+
+    def __init__(self, local_repo_path: str, usage_mode: str = "index",
+                 scan_workers: Optional[int] = None, line_numbers: bool = True):
+        """
+        :param local_repo_path: Путь к локальному клону репозитория
+        :param line_numbers: Дополнять строки diff'а номерами строк файла
+        """
+        # Клиент GitHub не нужен: коммиты и diff'ы берутся из git, поэтому сессия не создаётся
+        self._set_usage_mode(usage_mode, scan_workers)
+        self.github_token = None
+        self.client = None
+        self.local_repo_path = local_repo_path
+        self.line_numbers = line_numbers
+        if not os.path.isdir(local_repo_path):
+            raise ValueError(f"Локальный репозиторий не найден: {local_repo_path}")
+        self._git("rev-parse", "--git-dir")
+
+    def _git(self, *args: str) -> str:
+        result = subprocess.run(
+            ["git", "-C", self.local_repo_path, "-c", "core.quotePath=false", *args],
+            capture_output=True, text=True, encoding="utf-8", errors="replace"
+        )
+        if result.returncode != 0:
+            raise ValueError(f"git {args[0]} завершился с ошибкой: {result.stderr.strip()}")
+        return result.stdout
+
+    def get_user_commits(self, repo: str, author: str,
+                         start_date: Optional[str] = None,
+                         end_date: Optional[str] = None) -> List[Dict]:
+        """
+        Получить коммиты пользователя за период из git log (от новых к старым).
+
+        Автор сопоставляется с именем или email коммита, как в git log --author.
+        """
+        args = ["log", f"--author={author}", "--format=%H%x1f%aI%x1f%s"]
+        if start_date:
+            args.append(f"--since={datetime.strptime(start_date, '%Y-%m-%d'):%Y-%m-%d} 00:00:00")
+        if end_date:
+            args.append(f"--until={datetime.strptime(end_date, '%Y-%m-%d'):%Y-%m-%d} 23:59:59")
+
+        commits = []
+        for line in self._git(*args).splitlines():
+            sha, date, message = line.split("\x1f", 2)
+            commits.append({
+                "sha": sha,
+                "commit": {"author": {"date": date}, "message": message}
+            })
+        return commits
+
+    def get_commit_diff(self, repo: str, sha: str) -> Tuple[str, str]:
+        """Получить diff коммита из локального клона и URL коммита на GitHub."""
+        output = self._git(
+            "show", "--format=", "--no-color", "--no-ext-diff", "--diff-merges=first-parent",
+            # Префиксы задаются явно: с diff.noprefix в настройках пользователя имена файлов не распознались бы
+            "--src-prefix=a/", "--dst-prefix=b/", sha
+        )
+        diffs = [f"--- {filename}\n{patch}" for filename, patch in self._parse_patch(output)]
+        return "\n".join(diffs), f"https://github.com/{repo}/commit/{sha}"
+
+    def _parse_patch(self, output: str) -> List[Tuple[str, str]]:
+        """Разобрать вывод git show на пары (имя файла, patch в формате GitHub)."""
+        files = []
+        filename = None
+        lines = []
+        in_hunk = False
+        old_no = new_no = 0
+
+        for line in output.split("\n"):
+            if line.startswith("diff --git "):
+                if filename and lines:
+                    files.append((filename, "\n".join(lines)))
+                filename, lines, in_hunk = None, [], False
+                continue
+
+            header = self.hunk_header.match(line)
+            if header:
+                old_no, new_no = int(header.group(1)), int(header.group(2))
+                lines.append(line)
+                in_hunk = True
+                continue
+
+            if not in_hunk:
+                # К имени с пробелами git дописывает табуляцию
+                if line.startswith("--- a/"):
+                    filename = line[6:].rstrip("\t")
+                elif line.startswith("+++ b/"):
+                    filename = line[6:].rstrip("\t")
+                continue
+
+            if line.startswith("+"):
+                lines.append(self._numbered(line, new_no))
+                new_no += 1
+            elif line.startswith("-"):
+                lines.append(self._numbered(line, old_no))
+                old_no += 1
+            elif line.startswith(" "):
+                lines.append(self._numbered(line, new_no))
+                old_no += 1
+                new_no += 1
+            elif line.startswith("\\"):
+                lines.append(line)
+
+        if filename and lines:
+            files.append((filename, "\n".join(lines)))
+        return files
+
+    def _numbered(self, line: str, line_no: int) -> str:
+        """Добавить номер строки файла после знака +/-/пробела."""
+        if not self.line_numbers:
+            return line
+        return f"{line[0]}{line_no:>5} | {line[1:]}"
 
 
 class GitHubPRDiffCollector:
-    def __init__(self, github_token: str = None):
+    def __init__(self, github_token: str = None, client: Optional[GitHubClient] = None,
+                 pr_workers: int = 4, commit_workers: int = 8):
         """
         Инициализация коллектора diff'ов PR с GitHub
 
         :param github_token: Personal Access Token для GitHub API (необязательно, но увеличивает лимит запросов)
+        :param client: Общий HTTP-клиент GitHub; если не передан, создаётся собственный
+        :param pr_workers: Сколько PR обрабатывать параллельно
+        :param commit_workers: Сколько коммитов одного PR загружать параллельно
         """
         self.github_api_url = "https://api.github.com"
-        self.headers = {
-            "Accept": "application/vnd.github.v3+json"
-        }
-        if github_token:
-            self.headers["Authorization"] = f"token {github_token}"
+        self.client = client or GitHubClient(github_token)
+        self.pr_workers = pr_workers
+        self.commit_workers = commit_workers
 
     def get_user_prs(
         self,
@@ -120,6 +254,63 @@ class GitHubPRDiffCollector:
         if not username and not email:
             raise ValueError("Необходимо указать либо username, либо email")
 
+        # Список PR меняется, поэтому хранится с коротким TTL
+        key = f"prs:{repo_owner}/{repo_name}:{username}:{email}:{start_date}:{end_date}"
+        if username:
+            return self.client.cached_list(
+                key, lambda: self._search_user_prs(repo_owner, repo_name, username, start_date, end_date)
+            )
+        # Поиск GitHub не фильтрует по email, поэтому для него остаётся обход всех PR
+        return self.client.cached_list(
+            key, lambda: self._fetch_user_prs(repo_owner, repo_name, username, email, start_date, end_date)
+        )
+
+    def _search_user_prs(
+        self,
+        repo_owner: str,
+        repo_name: str,
+        username: str,
+        start_date: Optional[str],
+        end_date: Optional[str]
+    ) -> list[dict]:
+        """
+        Найти PR пользователя за период через Search API
+
+        Автор и период фильтруются на стороне GitHub квалификаторами author: и created:,
+        поэтому загружаются только нужные PR. Search API отдаёт не больше 1000 результатов.
+        """
+        query = f"repo:{repo_owner}/{repo_name} is:pr author:{username}"
+        for date in (start_date, end_date):
+            if date:
+                datetime.strptime(date, "%Y-%m-%d")
+        if start_date and end_date:
+            query += f" created:{start_date}..{end_date}"
+        elif start_date:
+            query += f" created:>={start_date}"
+        elif end_date:
+            query += f" created:<={end_date}"
+
+        params = {
+            "q": query,
+            "sort": "created",
+            "order": "desc",
+            "per_page": 100
+        }
+        prs = []
+        for page in self.client.paginate(f"{self.github_api_url}/search/issues", params):
+            prs.extend(page.get("items", []))
+        return prs
+
+    def _fetch_user_prs(
+        self,
+        repo_owner: str,
+        repo_name: str,
+        username: Optional[str],
+        email: Optional[str],
+        start_date: Optional[str],
+        end_date: Optional[str]
+    ) -> list[dict]:
+        """Загрузить PR пользователя за период обходом всех PR репозитория."""
         prs = []
         page = 1
 
@@ -137,9 +328,7 @@ class GitHubPRDiffCollector:
                 "per_page": 100
             }
 
-            response = requests.get(url, headers=self.headers, params=params)
-            response.raise_for_status()
-            data = response.json()
+            data = self.client.get(url, params=params).json()
 
             if not data:
                 break
@@ -184,18 +373,22 @@ class GitHubPRDiffCollector:
         :return: Список diff'ов коммитов в PR
         """
         url = f"{self.github_api_url}/repos/{repo_owner}/{repo_name}/pulls/{pr_number}/commits"
-        response = requests.get(url, headers=self.headers)
-        response.raise_for_status()
-        commits = response.json()
+        # GitHub отдаёт по этому адресу не больше 250 коммитов PR
+        commits = self.client.cached_list(
+            f"pr_commits:{repo_owner}/{repo_name}:{pr_number}",
+            lambda: [commit for page in self.client.paginate(url, {"per_page": 100}) for commit in page]
+        )
+
+        # Получаем diff'ы отдельных коммитов параллельно, сохраняя их порядок
+        with ThreadPoolExecutor(max_workers=self.commit_workers) as executor:
+            commits_data = list(executor.map(
+                lambda commit: self.client.get_commit(f"{repo_owner}/{repo_name}", commit["sha"]),
+                commits
+            ))
 
         diffs = []
-        for commit in commits:
+        for commit, commit_data in zip(commits, commits_data):
             commit_sha = commit["sha"]
-            # Получаем diff отдельного коммита
-            commit_url = f"{self.github_api_url}/repos/{repo_owner}/{repo_name}/commits/{commit_sha}"
-            commit_response = requests.get(commit_url, headers=self.headers)
-            commit_response.raise_for_status()
-            commit_data = commit_response.json()
 
             if "files" in commit_data:
                 for file in commit_data["files"]:
@@ -212,6 +405,23 @@ class GitHubPRDiffCollector:
 
         return diffs
 
+    def get_pr_diff(self, repo: str, pr_number: int) -> Tuple[str, str]:
+        """
+        Получить итоговый diff PR (без промежуточных коммитов) и его URL
+
+        :param repo: Репозиторий в формате owner/repo
+        :param pr_number: Номер Pull Request
+        :return: diff в том же формате, что и GitHubDiffsCollector.get_commit_diff, и URL PR
+        """
+        url = f"{self.github_api_url}/repos/{repo}/pulls/{pr_number}/files"
+        diffs = []
+        for files in self.client.paginate(url, {"per_page": 100}):
+            for file in files:
+                if "patch" in file:
+                    diffs.append(f"--- {file['filename']}\n{file['patch']}")
+
+        return "\n".join(diffs), f"https://github.com/{repo}/pull/{pr_number}"
+
     def collect_pr_diffs(
         self,
         repo: str,
@@ -241,11 +451,14 @@ class GitHubPRDiffCollector:
             print("PR не найдены")
             return []
 
-        all_diffs = []
-        for pr in prs:
+        def collect(pr: dict) -> list[dict]:
             print(f"Обработка PR #{pr['number']}: {pr['title']}")
-            pr_diffs = self.get_commit_diffs(repo_owner, repo_name, pr["number"])
-            all_diffs.extend(pr_diffs)
+            return self.get_commit_diffs(repo_owner, repo_name, pr["number"])
+
+        all_diffs = []
+        with ThreadPoolExecutor(max_workers=self.pr_workers) as executor:
+            for pr_diffs in executor.map(collect, prs):
+                all_diffs.extend(pr_diffs)
 
         print(f"\nВсего найдено {len(all_diffs)} diff'ов в {len(prs)} PR")
         return all_diffs
@@ -0,0 +1,160 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Any, Tuple, Callable
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from backoff import backoff_delay
+from caches import GitHubResponseStore
+
+
+class GitHubClient:
+    """
+    Общий HTTP-клиент GitHub API.
+
+    Держит пул keep-alive соединений, повторяет запросы при ограничениях
+    частоты и ошибках 5xx с экспоненциальной задержкой и использует условные
+    запросы (ETag/If-None-Match), чтобы неизменившиеся ресурсы не тратили лимит.
+    """
+
+    api_url = "https://api.github.com"
+    retry_statuses = (500, 502, 503, 504)
+
+    def __init__(self, github_token: Optional[str] = None, pool_size: int = 20,
+                 max_retries: int = 5, backoff_factor: float = 1.0,
+                 max_backoff: float = 60., max_rate_limit_wait: float = 300.,
+                 etag_cache_size: int = 2048, timeout: float = 30.,
+                 store: Optional[GitHubResponseStore] = None):
+        """
+        :param github_token: Personal Access Token для GitHub API
+        :param pool_size: Размер пула соединений
+        :param max_retries: Максимальное число повторов одного запроса
+        :param backoff_factor: Базовая задержка экспоненциального backoff в секундах
+        :param max_backoff: Максимальная задержка между повторами при ошибках
+        :param max_rate_limit_wait: Сколько максимум ждать сброса лимита запросов, прежде чем сдаться
+        :param etag_cache_size: Сколько ответов хранить для условных запросов
+        :param timeout: Таймаут одного запроса в секундах
+        :param store: Дисковое хранилище коммитов и списков; без него всё берётся из API
+        """
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+        self.max_rate_limit_wait = max_rate_limit_wait
+        self.etag_cache_size = etag_cache_size
+        self.timeout = timeout
+        self.store = store
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.headers.update({"Accept": "application/vnd.github.v3+json"})
+        if github_token:
+            self.session.headers["Authorization"] = f"token {github_token}"
+
+        self._etag_cache: "OrderedDict[Tuple, requests.Response]" = OrderedDict()
+        self._etag_lock = threading.Lock()
+
+    def get(self, url: str, params: Optional[Dict[str, Any]] = None) -> requests.Response:
+        """
+        Выполнить GET-запрос с повторами и условным кэшированием.
+
+        :param url: Полный URL или путь относительно api.github.com
+        :param params: Query-параметры запроса
+        :return: Успешный ответ (для 304 — ранее сохранённый ответ)
+        """
+        if not url.startswith("http"):
+            url = f"{self.api_url}{url}"
+        key = (url, tuple(sorted((params or {}).items())))
+
+        with self._etag_lock:
+            cached = self._etag_cache.get(key)
+        headers = {"If-None-Match": cached.headers["ETag"]} if cached is not None else {}
+
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = backoff_delay(attempt, self.backoff_factor, self.max_backoff)
+                print(f"Ошибка соединения с GitHub API: {e}, повтор через {delay:.1f} с")
+                time.sleep(delay)
+                continue
+
+            if response.status_code == 304 and cached is not None:
+                with self._etag_lock:
+                    self._etag_cache.move_to_end(key)
+                return cached
+
+            delay = self._retry_delay(response, attempt)
+            if delay is None or attempt == self.max_retries:
+                break
+            print(f"GitHub API ответил {response.status_code}, повтор через {delay:.1f} с")
+            time.sleep(delay)
+
+        response.raise_for_status()
+
+        if response.headers.get("ETag"):
+            with self._etag_lock:
+                self._etag_cache[key] = response
+                self._etag_cache.move_to_end(key)
+                while len(self._etag_cache) > self.etag_cache_size:
+                    self._etag_cache.popitem(last=False)
+        return response
+
+    def paginate(self, url: str, params: Optional[Dict[str, Any]] = None) -> Iterator[Any]:
+        """Последовательно отдать JSON всех страниц, следуя заголовку Link."""
+        while url:
+            response = self.get(url, params=params)
+            yield response.json()
+            # URL следующей страницы уже содержит все параметры
+            url = response.links.get("next", {}).get("url")
+            params = None
+
+    def get_commit(self, repo: str, sha: str) -> Dict[str, Any]:
+        """Получить данные коммита /repos/{repo}/commits/{sha}, по возможности из хранилища."""
+        cacheable = self.store is not None and self.store.is_full_sha(sha)
+        if cacheable:
+            data = self.store.get_commit(repo, sha)
+            if data is not None:
+                return data
+
+        data = self.get(f"/repos/{repo}/commits/{sha}").json()
+        if cacheable:
+            self.store.put_commit(repo, sha, data)
+        return data
+
+    def cached_list(self, key: str, loader: Callable[[], List[Any]]) -> List[Any]:
+        """Получить список из хранилища (с коротким TTL) или загрузить его через loader."""
+        if self.store is None:
+            return loader()
+        data = self.store.get_list(key)
+        if data is None:
+            data = loader()
+            self.store.put_list(key, data)
+        return data
+
+    def _retry_delay(self, response: requests.Response, attempt: int) -> Optional[float]:
+        """Сколько ждать перед повтором запроса или None, если повторять не нужно."""
+        status = response.status_code
+        if status in self.retry_statuses:
+            return backoff_delay(attempt, self.backoff_factor, self.max_backoff)
+        if status not in (403, 429):
+            return None
+
+        retry_after = response.headers.get("Retry-After")
+        if retry_after is not None:
+            delay = float(retry_after)
+        elif response.headers.get("X-RateLimit-Remaining") == "0":
+            reset = float(response.headers.get("X-RateLimit-Reset", time.time()))
+            delay = max(reset - time.time(), 1.)
+        elif status == 429 or "rate limit" in response.text.lower():
+            # Вторичный лимит без явного времени ожидания
+            delay = backoff_delay(attempt, self.backoff_factor, self.max_backoff)
+        else:
+            # Обычный 403: нет доступа, повтор не поможет
+            return None
+
+        return delay if delay <= self.max_rate_limit_wait else None
@@ -0,0 +1,159 @@
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Tuple, Iterator
+
+
+class ReviewHistory:
+    """
+    Персистентная история ревью для инкрементального анализа в SQLite.
+
+    Для каждой пары (repo, user) и режима анализа хранятся результаты уже
+    отревьюенных коммитов/PR и водяной знак — дата последней обработанной единицы,
+    поэтому повторный запуск запрашивает у GitHub и отправляет модели только новое.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS reviewed_items (
+                    repo TEXT NOT NULL,
+                    user TEXT NOT NULL,
+                    granularity TEXT NOT NULL,
+                    item_key TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    item_date TEXT NOT NULL,
+                    review TEXT NOT NULL,
+                    score REAL NOT NULL,
+                    reviewed_at TEXT NOT NULL,
+                    PRIMARY KEY (repo, user, granularity, item_key)
+                )
+            """)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS watermarks (
+                    repo TEXT NOT NULL,
+                    user TEXT NOT NULL,
+                    granularity TEXT NOT NULL,
+                    item_key TEXT NOT NULL,
+                    item_date TEXT NOT NULL,
+                    updated_at TEXT NOT NULL,
+                    covered_from TEXT,
+                    PRIMARY KEY (repo, user, granularity)
+                )
+            """)
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(watermarks)")}
+            if "covered_from" not in columns:
+                # У знаков из старых баз начало покрытого периода неизвестно, и их период запрашивается целиком
+                self._conn.execute("ALTER TABLE watermarks ADD COLUMN covered_from TEXT")
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now().isoformat(timespec="seconds")
+
+    def get_watermark(self, repo: str, user: str, granularity: str) -> Optional[Dict[str, Any]]:
+        """
+        Покрытый период истории: {"item_key", "item_date", "covered_from", "updated_at"} или None.
+
+        Все единицы ревью с covered_from (YYYY-MM-DD, "" — с самого начала) по item_date
+        (дата последней обработанной единицы) уже обработаны; covered_from None — начало неизвестно.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT item_key, item_date, covered_from, updated_at FROM watermarks "
+                "WHERE repo = ? AND user = ? AND granularity = ?",
+                (repo, user, granularity)
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def set_watermark(self, repo: str, user: str, granularity: str, item_key: str, item_date: str,
+                      covered_from: Optional[str]):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO watermarks "
+                "(repo, user, granularity, item_key, item_date, covered_from, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (repo, user, granularity, item_key, item_date, covered_from, self._now())
+            )
+
+    def known_versions(self, repo: str, user: str, granularity: str) -> Dict[str, str]:
+        """Уже отревьюенные единицы: ключ (SHA или номер PR) -> версия, с которой делалось ревью."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT item_key, version FROM reviewed_items WHERE repo = ? AND user = ? AND granularity = ?",
+                (repo, user, granularity)
+            ).fetchall()
+        return {row["item_key"]: row["version"] for row in rows}
+
+    def save(self, repo: str, user: str, granularity: str, item_key: str, version: str,
+             item_date: str, review: Dict[str, Any], score: float):
+        """Сохранить результат ревью единицы (повторное ревью заменяет прежний)."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO reviewed_items "
+                "(repo, user, granularity, item_key, version, item_date, review, score, reviewed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (repo, user, granularity, item_key, version, item_date,
+                 json.dumps(review, ensure_ascii=False), score, self._now())
+            )
+
+    def results(self, repo: str, user: str, granularity: str,
+                start_date: Optional[str] = None, end_date: Optional[str] = None,
+                exclude: Optional[List[str]] = None) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Сохранённые результаты за период (даты в формате YYYY-MM-DD, включительно), от новых к старым.
+
+        :param exclude: Ключи, которые не нужно возвращать (например, те, что ревьюятся заново)
+        :return: Список пар (ревью, оценка)
+        """
+        query = "SELECT item_key, review, score FROM reviewed_items WHERE repo = ? AND user = ? AND granularity = ?"
+        args = [repo, user, granularity]
+        if start_date:
+            query += " AND substr(item_date, 1, 10) >= ?"
+            args.append(start_date)
+        if end_date:
+            query += " AND substr(item_date, 1, 10) <= ?"
+            args.append(end_date)
+        query += " ORDER BY item_date DESC"
+        with self._lock:
+            rows = self._conn.execute(query, args).fetchall()
+        excluded = set(exclude or ())
+        return [
+            (json.loads(row["review"]), row["score"])
+            for row in rows
+            if row["item_key"] not in excluded
+        ]
+
+    def iter_reviews(self, repos: Optional[List[str]] = None, users: Optional[List[str]] = None,
+                     start_date: Optional[str] = None, end_date: Optional[str] = None,
+                     granularity: str = "commits") -> Iterator[Tuple[str, str, str, Dict[str, Any]]]:
+        """
+        Перебрать сохранённые ревью (repo, user, дата, ревью) без загрузки всей выборки в память.
+
+        :param repos: Только эти репозитории (по умолчанию — все)
+        :param users: Только эти пользователи (по умолчанию — все)
+        """
+        query = "SELECT repo, user, item_date, review FROM reviewed_items WHERE granularity = ?"
+        args: List[Any] = [granularity]
+        for column, values in (("repo", repos), ("user", users)):
+            if values:
+                query += f" AND {column} IN ({', '.join('?' for _ in values)})"
+                args.extend(values)
+        if start_date:
+            query += " AND substr(item_date, 1, 10) >= ?"
+            args.append(start_date)
+        if end_date:
+            query += " AND substr(item_date, 1, 10) <= ?"
+            args.append(end_date)
+
+        # Отдельное соединение, чтобы долгий перебор не держал общую блокировку
+        conn = sqlite3.connect(self.db_path)
+        try:
+            for repo, user, item_date, review in conn.execute(query, args):
+                yield repo, user, item_date, json.loads(review)
+        finally:
+            conn.close()
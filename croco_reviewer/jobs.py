@@ -0,0 +1,130 @@
+import json
+import sqlite3
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Callable
+
+# Функция анализа: принимает параметры задачи и callback прогресса (stage, done, total)
+ProgressCallback = Callable[[str, int, int], None]
+JobRunner = Callable[[Dict[str, Any], ProgressCallback], Dict[str, Any]]
+
+
+class JobStore:
+    """Персистентное хранилище задач анализа в SQLite."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    params TEXT NOT NULL,
+                    stage TEXT,
+                    done INTEGER NOT NULL DEFAULT 0,
+                    total INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    created_at TEXT NOT NULL,
+                    updated_at TEXT NOT NULL
+                )
+            """)
+
+    @staticmethod
+    def _now() -> str:
+        return datetime.now().isoformat(timespec="seconds")
+
+    def create(self, params: Dict[str, Any]) -> str:
+        """Создать задачу в статусе queued и вернуть её ID."""
+        job_id = uuid.uuid4().hex
+        now = self._now()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, params, stage, created_at, updated_at) "
+                "VALUES (?, 'queued', ?, 'queued', ?, ?)",
+                (job_id, json.dumps(params, ensure_ascii=False), now, now)
+            )
+        return job_id
+
+    def update(self, job_id: str, **fields: Any):
+        """Обновить поля задачи (status, stage, done, total, result, error)."""
+        if "result" in fields and fields["result"] is not None:
+            fields["result"] = json.dumps(fields["result"], ensure_ascii=False)
+        fields["updated_at"] = self._now()
+        columns = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE jobs SET {columns} WHERE id = ?",
+                (*fields.values(), job_id)
+            )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Получить задачу по ID или None, если её нет."""
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["params"] = json.loads(job["params"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def get_version(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Статус и время обновления задачи без загрузки результата."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, updated_at FROM jobs WHERE id = ?", (job_id,)
+            ).fetchone()
+        return dict(row) if row is not None else None
+
+    def unfinished(self) -> List[Dict[str, Any]]:
+        """Задачи, которые не успели завершиться (например, до перезапуска сервиса)."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, params FROM jobs WHERE status IN ('queued', 'running') ORDER BY created_at"
+            ).fetchall()
+        return [{"id": row["id"], "params": json.loads(row["params"])} for row in rows]
+
+
+class JobManager:
+    """Очередь фоновых задач анализа с ограничением числа одновременных задач."""
+
+    def __init__(self, store: JobStore, runner: JobRunner, max_workers: int = 2):
+        self.store = store
+        self.runner = runner
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+
+    def submit(self, params: Dict[str, Any]) -> str:
+        """Поставить анализ в очередь и сразу вернуть ID задачи."""
+        job_id = self.store.create(params)
+        self.executor.submit(self._run, job_id, params)
+        return job_id
+
+    def resume(self):
+        """Повторно поставить в очередь задачи, прерванные перезапуском."""
+        for job in self.store.unfinished():
+            print(f"Возобновление задачи {job['id']}")
+            self.store.update(job["id"], status="queued", stage="queued", done=0, total=0)
+            self.executor.submit(self._run, job["id"], job["params"])
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job_id: str, params: Dict[str, Any]):
+        self.store.update(job_id, status="running", stage="collecting")
+
+        def progress(stage: str, done: int, total: int):
+            self.store.update(job_id, stage=stage, done=done, total=total)
+
+        try:
+            report = self.runner(params, progress)
+        except Exception as e:
+            print(f"Задача {job_id} завершилась с ошибкой: {e}")
+            self.store.update(job_id, status="failed", stage="failed", error=str(e))
+            return
+        self.store.update(job_id, status="done", stage="done", result=report)
@@ -0,0 +1,136 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Iterator, Any
+
+
+class LLMRateLimiter:
+    """
+    Общий для процесса ограничитель запросов к модели.
+
+    Ограничивает число одновременных вызовов, частоту запросов и число токенов
+    в скользящем окне в минуту, чтобы параллельные анализы не упирались в квоту
+    Yandex Cloud. После ошибки квоты все запросы приостанавливаются на время backoff.
+    """
+
+    window = 60.
+
+    def __init__(self, max_concurrency: int = 8, requests_per_second: float = 0.,
+                 tokens_per_minute: int = 0):
+        """
+        :param max_concurrency: Максимальное число одновременных запросов
+        :param requests_per_second: Максимальная частота запросов (0 — без ограничения)
+        :param tokens_per_minute: Бюджет токенов в минуту (0 — без ограничения)
+        """
+        self.max_concurrency = max_concurrency
+        self.requests_per_second = requests_per_second
+        self.tokens_per_minute = tokens_per_minute
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._cond = threading.Condition()
+        self._next_request_at = 0.
+        self._token_log: "deque[List]" = deque()  # [время, токены] запросов в текущем окне
+        self._window_tokens = 0
+
+        self.requests = 0
+        self.tokens = 0
+        self.in_flight = 0
+        self.throttled_seconds = 0.
+        self.retries = 0
+        self.quota_errors = 0
+        self.failures = 0
+
+    def _expire(self, now: float):
+        while self._token_log and now - self._token_log[0][0] >= self.window:
+            self._window_tokens -= self._token_log.popleft()[1]
+
+    def _wait_for_budget(self, tokens: int) -> List:
+        """Дождаться, пока запрос уложится в частоту и бюджет токенов, и занять его место в окне."""
+        started = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._expire(now)
+                wait = self._next_request_at - now
+                # Запрос больше всего бюджета пропускаем, когда окно пустое, иначе он не пройдёт никогда
+                if self.tokens_per_minute and self._token_log \
+                        and self._window_tokens + tokens > self.tokens_per_minute:
+                    wait = max(wait, self._token_log[0][0] + self.window - now)
+                if wait <= 0:
+                    break
+                self._cond.wait(wait)
+
+            if self.requests_per_second:
+                self._next_request_at = now + 1. / self.requests_per_second
+            entry = [now, tokens]
+            self._token_log.append(entry)
+            self._window_tokens += tokens
+            self.throttled_seconds += now - started
+            self.requests += 1
+            self.in_flight += 1
+            return entry
+
+    @contextmanager
+    def slot(self, tokens: int) -> Iterator[Dict[str, int]]:
+        """
+        Занять место для одного запроса к модели.
+
+        :param tokens: Оценка числа токенов запроса
+        :return: Словарь, в котором можно указать фактическое число токенов ("tokens") после ответа
+        """
+        started = time.monotonic()
+        self._slots.acquire()
+        with self._cond:
+            self.throttled_seconds += time.monotonic() - started
+        try:
+            entry = self._wait_for_budget(tokens)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        usage = {"tokens": tokens}
+        try:
+            yield usage
+        finally:
+            self._slots.release()
+            with self._cond:
+                self.in_flight -= 1
+                actual = usage["tokens"]
+                self.tokens += actual
+                # Окно учитывает фактический расход, если он известен и запрос ещё в окне
+                if time.monotonic() - entry[0] < self.window:
+                    self._window_tokens += actual - entry[1]
+                    entry[1] = actual
+                self._cond.notify_all()
+
+    def pause(self, seconds: float):
+        """Приостановить все запросы (например, после ошибки квоты)."""
+        with self._cond:
+            self._next_request_at = max(self._next_request_at, time.monotonic() + seconds)
+            self.quota_errors += 1
+
+    def record_retry(self):
+        with self._cond:
+            self.retries += 1
+
+    def record_failure(self):
+        with self._cond:
+            self.failures += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Счётчики запросов, токенов, ожидания и ошибок для подбора лимитов под квоту."""
+        with self._cond:
+            self._expire(time.monotonic())
+            return {
+                "max_concurrency": self.max_concurrency,
+                "requests_per_second": self.requests_per_second,
+                "tokens_per_minute": self.tokens_per_minute,
+                "requests": self.requests,
+                "tokens": self.tokens,
+                "tokens_last_minute": self._window_tokens,
+                "in_flight": self.in_flight,
+                "throttled_seconds": round(self.throttled_seconds, 3),
+                "retries": self.retries,
+                "quota_errors": self.quota_errors,
+                "failures": self.failures
+            }
@@ -1,17 +1,102 @@
 import requests
 import os
+import json
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 
-from fastapi import FastAPI, HTTPException
-from typing import Dict, Any
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse, FileResponse, Response
+from typing import Dict, List, Any, Optional, Callable, Iterator, Literal
 from pydantic import BaseModel
 
-from diffs_collectors import GitHubDiffsCollector
+from diffs_collectors import GitHubDiffsCollector, GitHubPRDiffCollector, LocalGitDiffsCollector
 from analyzers import MergeRequestAnalyzer, CodeReviewPrompts, YandexGPTReviewer
+from jobs import JobStore, JobManager
+from caches import ReviewCache, GitHubResponseStore, RenderedReportCache
+from otchets_former import MRReportRenderer
+from history import ReviewHistory
+from aggregates import ReviewColumns, aggregate, DEFAULT_PROBLEM_WEIGHTS
+from llm_limiter import LLMRateLimiter
+from review_schema import PARSE_STATS
+from github_client import GitHubClient
 
 load_dotenv()
 
-app = FastAPI(title="GitHub Merge Request Analyzer")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    warm_up = os.getenv("LLM_WARMUP", "")
+    if warm_up:
+        loop = asyncio.get_running_loop()
+        try:
+            await loop.run_in_executor(ANALYSIS_EXECUTOR, SERVICES.warm_up, warm_up == "ping")
+        except Exception as e:
+            print(f"Не удалось прогреть клиент модели: {e}")
+    JOB_MANAGER.resume()
+    yield
+    JOB_MANAGER.shutdown()
+
+
+app = FastAPI(title="GitHub Merge Request Analyzer", lifespan=lifespan)
+
+# Анализ целиком блокирующий (requests, YCloudML SDK), поэтому выполняется
+# в отдельном пуле потоков и не занимает event loop uvicorn
+ANALYSIS_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.getenv("ANALYSIS_WORKERS", 4)),
+    thread_name_prefix="analysis"
+)
+
+# Рендер отчётов и статистика выполняются в своём пуле, чтобы не ждать долгих анализов
+REPORTS_EXECUTOR = ThreadPoolExecutor(
+    max_workers=int(os.getenv("REPORT_WORKERS", 2)),
+    thread_name_prefix="reports"
+)
+
+
+REPORTS_DIR = os.path.join(os.path.dirname(__file__), "reports")
+
+# Кэш ответов модели общий для всех запросов и переживает перезапуск
+REVIEW_CACHE = ReviewCache(
+    os.getenv("REVIEW_CACHE_PATH") or os.path.join(REPORTS_DIR, "review_cache.sqlite3"),
+    ttl=int(os.getenv("REVIEW_CACHE_TTL", 30 * 24 * 3600)),
+    max_entries=int(os.getenv("REVIEW_CACHE_MAX_ENTRIES", 100000))
+)
+
+
+# Отрендеренные отчёты фоновых задач, чтобы повторный просмотр не рендерил их заново
+RENDERED_REPORTS = RenderedReportCache(
+    os.getenv("RENDERED_REPORTS_DIR") or os.path.join(REPORTS_DIR, "rendered"),
+    max_entries=int(os.getenv("RENDERED_REPORTS_MAX_ENTRIES", 500))
+)
+
+
+# Квота Yandex Cloud общая для процесса, поэтому и ограничитель запросов к модели один на все анализы
+LLM_LIMITER = LLMRateLimiter(
+    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", 8)),
+    requests_per_second=float(os.getenv("LLM_REQUESTS_PER_SECOND", 0)),
+    tokens_per_minute=int(os.getenv("LLM_TOKENS_PER_MINUTE", 0))
+)
+
+
+# История ревью для инкрементального анализа: что уже отревьюено для каждой пары repo/user
+REVIEW_HISTORY = ReviewHistory(
+    os.getenv("REVIEW_HISTORY_PATH") or os.path.join(REPORTS_DIR, "history.sqlite3")
+)
+
+
+# Один пул соединений с GitHub на весь процесс
+GITHUB_CLIENT = GitHubClient(
+    os.getenv("GITHUB_KEY"),
+    pool_size=int(os.getenv("GITHUB_POOL_SIZE", 20)),
+    max_retries=int(os.getenv("GITHUB_MAX_RETRIES", 5)),
+    store=GitHubResponseStore(
+        os.getenv("GITHUB_CACHE_DIR") or os.path.join(REPORTS_DIR, "github_cache"),
+        list_ttl=int(os.getenv("GITHUB_LIST_TTL", 600))
+    )
+)
 
 
 class AnalysisRequest(BaseModel):
@@ -20,6 +105,164 @@ class AnalysisRequest(BaseModel):
     start_date: str
     end_date: str
     local_repo_path: str
+    granularity: Literal["commits", "prs"] = "commits"
+    diff_source: Literal["github", "local"] = "github"
+    incremental: bool = False
+
+
+class BulkAnalysisRequest(BaseModel):
+    repos: List[str]
+    users: List[str]
+    start_date: str
+    end_date: str
+    local_repo_paths: Dict[str, str] = {}
+    granularity: Literal["commits", "prs"] = "commits"
+
+
+class SharedServices:
+    """
+    Объекты, общие для всех запросов: ревьюер с клиентом YCloudML и коллекторы GitHub.
+
+    Создаются один раз при первом обращении (или при прогреве на старте), поэтому
+    инициализация SDK, авторизация и настройка модели не повторяются на каждый запрос.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._reviewer: Optional[YandexGPTReviewer] = None
+        self._github_collector: Optional[GitHubDiffsCollector] = None
+        self._pr_collector: Optional[GitHubPRDiffCollector] = None
+        self.prompt_generator = CodeReviewPrompts()
+        self.usage_mode = os.getenv("USAGE_SEARCH_MODE", "index")
+        self.scan_workers = int(os.getenv("USAGE_SCAN_WORKERS") or 0) or None
+
+    def reviewer(self) -> YandexGPTReviewer:
+        if self._reviewer is None:
+            with self._lock:
+                if self._reviewer is None:
+                    self._reviewer = YandexGPTReviewer(
+                        os.getenv("FOLDER_ID"), os.getenv("ACCESS_KEY"),
+                        model_name=os.getenv("MODEL_NAME", "yandexgpt"),
+                        model_version=os.getenv("MODEL_VERSION", "rc"),
+                        temperature=float(os.getenv("MODEL_TEMPERATURE", 0.3)),
+                        cache=REVIEW_CACHE,
+                        limiter=LLM_LIMITER,
+                        max_retries=int(os.getenv("LLM_MAX_RETRIES", 4))
+                    )
+        return self._reviewer
+
+    def github_collector(self) -> GitHubDiffsCollector:
+        if self._github_collector is None:
+            with self._lock:
+                if self._github_collector is None:
+                    self._github_collector = GitHubDiffsCollector(
+                        os.getenv("GITHUB_KEY"), client=GITHUB_CLIENT,
+                        usage_mode=self.usage_mode, scan_workers=self.scan_workers
+                    )
+        return self._github_collector
+
+    def pr_collector(self) -> GitHubPRDiffCollector:
+        if self._pr_collector is None:
+            with self._lock:
+                if self._pr_collector is None:
+                    self._pr_collector = GitHubPRDiffCollector(os.getenv("GITHUB_KEY"), client=GITHUB_CLIENT)
+        return self._pr_collector
+
+    def local_collector(self, local_repo_path: str) -> LocalGitDiffsCollector:
+        """Локальный коллектор привязан к клону, поэтому создаётся на каждый запрос."""
+        return LocalGitDiffsCollector(local_repo_path, usage_mode=self.usage_mode, scan_workers=self.scan_workers)
+
+    def warm_up(self, ping: bool = False):
+        """Создать общие объекты заранее; с ping — ещё и открыть соединение с моделью коротким запросом."""
+        self.github_collector()
+        self.pr_collector()
+        reviewer = self.reviewer()
+        if ping:
+            reviewer.warm_up()
+
+
+SERVICES = SharedServices()
+
+
+def build_analyzer(diff_source: str = "github", local_repo_path: str = "") -> MergeRequestAnalyzer:
+    """Собрать анализатор поверх общих ревьюера и коллекторов."""
+    if diff_source == "local":
+        github_collector = SERVICES.local_collector(local_repo_path)
+    else:
+        github_collector = SERVICES.github_collector()
+
+    return MergeRequestAnalyzer(
+        github_collector, SERVICES.prompt_generator, SERVICES.reviewer(),
+        fetch_workers=int(os.getenv("FETCH_WORKERS", 4)),
+        usage_workers=int(os.getenv("USAGE_WORKERS", 2)),
+        review_workers=int(os.getenv("REVIEW_WORKERS", 4)),
+        token_budget=int(os.getenv("PROMPT_TOKEN_BUDGET", 8000)),
+        batch_token_budget=int(os.getenv("BATCH_TOKEN_BUDGET", 0)),
+        batch_commit_tokens=int(os.getenv("BATCH_COMMIT_TOKENS", 500)),
+        batch_max_commits=int(os.getenv("BATCH_MAX_COMMITS", 10)),
+        pr_collector=SERVICES.pr_collector(),
+        history=REVIEW_HISTORY
+    )
+
+
+def run_analysis(request: AnalysisRequest,
+                 progress: Optional[Callable[[str, int, int], None]] = None) -> Dict[str, Any]:
+    """Синхронно выполнить полный цикл анализа: сбор diff'ов, построение промптов и ревью."""
+    return build_analyzer(request.diff_source, request.local_repo_path).analyze(
+        repo=request.repo,
+        user=request.user,
+        local_repo_path=request.local_repo_path,
+        start_date=request.start_date,
+        end_date=request.end_date,
+        progress=progress,
+        granularity=request.granularity,
+        incremental=request.incremental
+    )
+
+
+def stream_analysis(request: AnalysisRequest) -> Iterator[Dict[str, Any]]:
+    """Ленивый вариант run_analysis: записи iter_analyze по мере готовности ревью."""
+    return build_analyzer(request.diff_source, request.local_repo_path).iter_analyze(
+        repo=request.repo,
+        user=request.user,
+        local_repo_path=request.local_repo_path,
+        start_date=request.start_date,
+        end_date=request.end_date,
+        granularity=request.granularity,
+        incremental=request.incremental
+    )
+
+
+def run_bulk_analysis(request: BulkAnalysisRequest,
+                      progress: Optional[Callable[[str, int, int], None]] = None) -> Dict[str, Any]:
+    """Синхронно проанализировать все пары репозиторий × пользователь одним анализатором."""
+    if not request.repos or not request.users:
+        raise ValueError("Нужен хотя бы один репозиторий и один пользователь")
+    return build_analyzer().analyze_many(
+        repos=request.repos,
+        users=request.users,
+        start_date=request.start_date,
+        end_date=request.end_date,
+        local_repo_paths=request.local_repo_paths,
+        progress=progress,
+        granularity=request.granularity
+    )
+
+
+def _error_record(e: Exception) -> Dict[str, Any]:
+    """Запись об ошибке для потока; коды ошибок те же, что у POST /analyze."""
+    if isinstance(e, ValueError):
+        return {"type": "error", "status_code": 400, "detail": str(e)}
+    if isinstance(e, requests.exceptions.RequestException):
+        return {"type": "error", "status_code": 502, "detail": f"GitHub API error: {str(e)}"}
+    return {"type": "error", "status_code": 500, "detail": str(e)}
+
+
+JOB_MANAGER = JobManager(
+    JobStore(os.getenv("JOBS_DB_PATH") or os.path.join(REPORTS_DIR, "jobs.sqlite3")),
+    runner=lambda params, progress: run_analysis(AnalysisRequest(**params), progress),
+    max_workers=int(os.getenv("JOB_WORKERS", 2))
+)
 
 
 @app.post("/analyze", response_model=Dict[str, Any])
@@ -33,23 +276,16 @@ async def analyze_mr(request: AnalysisRequest):
     - start_date: Начальная дата периода анализа (формат YYYY-MM-DD)
     - end_date: Конечная дата периода анализа (формат YYYY-MM-DD)
     - local_repo_path: Путь к локальной копии репозитория (для поиска использования изменённых идентификаторов)
+    - granularity: "commits" (по умолчанию) — ревью каждого коммита, "prs" — ревью итогового diff'а каждого PR
+    - diff_source: "github" (по умолчанию) — коммиты и diff'ы из GitHub API, "local" — из локального клона local_repo_path
+    - incremental: ревьюить только коммиты/PR, которых ещё нет в истории, и объединить их с прежними результатами
 
     Возвращает:
     - Отчёт с метаданными и результатами анализа
     """
     try:
-        github_collector = GitHubDiffsCollector(os.getenv("GITHUB_KEY"))
-        prompt_generator = CodeReviewPrompts()
-        reviewer = YandexGPTReviewer(os.getenv("FOLDER_ID"), os.getenv("ACCESS_KEY"))
-
-        analyzer = MergeRequestAnalyzer(github_collector, prompt_generator, reviewer)
-        report = analyzer.analyze(
-            repo=request.repo,
-            user=request.user,
-            local_repo_path=request.local_repo_path,
-            start_date=request.start_date,
-            end_date=request.end_date
-        )
+        loop = asyncio.get_running_loop()
+        report = await loop.run_in_executor(ANALYSIS_EXECUTOR, run_analysis, request)
 
         return report
     except ValueError as e:
@@ -60,16 +296,270 @@ async def analyze_mr(request: AnalysisRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/analyze/bulk", response_model=Dict[str, Any])
+async def analyze_bulk(request: BulkAnalysisRequest):
+    """
+    Анализирует сразу несколько репозиториев и пользователей (все пары repos × users).
+
+    Параметры:
+    - repos: Список репозиториев в формате 'owner/repo'
+    - users: Список имён пользователей GitHub
+    - start_date, end_date: Период анализа (формат YYYY-MM-DD)
+    - local_repo_paths: Пути к локальным копиям по имени репозитория (для поиска применений)
+    - granularity: "commits" (по умолчанию) или "prs", как в POST /analyze
+
+    Коммит, попавший в несколько пар, ревьюится один раз, а число одновременных запросов
+    к модели ограничено для всего анализа, а не для каждой пары.
+
+    Возвращает:
+    - reports: Отчёты по каждой паре в формате POST /analyze (с полем error, если пару не удалось собрать)
+    - team: Сводка по команде — средняя оценка, итоги по пользователям и репозиториям, число повторов
+    """
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(ANALYSIS_EXECUTOR, run_bulk_analysis, request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except requests.exceptions.RequestException as e:
+        raise HTTPException(status_code=502, detail=f"GitHub API error: {str(e)}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/analyze/stream")
+async def analyze_mr_stream(request: AnalysisRequest, format: Literal["ndjson", "sse"] = "ndjson"):
+    """
+    Тот же анализ, что и POST /analyze, но результаты отдаются по мере готовности каждого ревью.
+
+    Параметры тела запроса те же, что и у POST /analyze; query-параметр format — "ndjson" (по умолчанию)
+    или "sse" (Server-Sent Events).
+
+    Каждая запись потока — JSON-объект:
+    - {"type": "result", "review", "mean_score", "done", "total"} — готовое ревью и средняя оценка на текущий момент
+    - {"type": "metadata", "metadata"} — итоговые метаданные, как в отчёте POST /analyze (последняя запись)
+    - {"type": "error", "status_code", "detail"} — ошибка анализа, после неё поток закрывается
+    """
+    loop = asyncio.get_running_loop()
+    done = object()
+
+    async def records():
+        queue: asyncio.Queue = asyncio.Queue()
+        cancelled = threading.Event()
+
+        def publish(record: Any):
+            if not cancelled.is_set():
+                loop.call_soon_threadsafe(queue.put_nowait, record)
+
+        def produce():
+            # Генератор блокирующий, поэтому каждый ответ читает его в своём потоке-производителе,
+            # а не в пуле анализа; закрывается генератор тоже здесь, а не из другого потока
+            iterator = None
+            try:
+                iterator = stream_analysis(request)
+                for record in iterator:
+                    if cancelled.is_set():
+                        break
+                    publish(record)
+            except Exception as e:
+                publish(_error_record(e))
+            finally:
+                if iterator is not None:
+                    # Закрытие генератора отменяет ещё не начатые ревью
+                    iterator.close()
+                publish(done)
+
+        threading.Thread(target=produce, name="analysis-stream", daemon=True).start()
+        try:
+            while True:
+                record = await queue.get()
+                if record is done:
+                    break
+                yield record
+        finally:
+            # Клиент отключился или поток завершён: производитель остановится после текущей записи
+            cancelled.set()
+
+    async def encode():
+        async for record in records():
+            payload = json.dumps(record, ensure_ascii=False)
+            yield f"data: {payload}\n\n" if format == "sse" else f"{payload}\n"
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    return StreamingResponse(encode(), media_type=media_type)
+
+
+@app.post("/jobs")
+async def submit_job(request: AnalysisRequest):
+    """
+    Ставит анализ в фоновую очередь и сразу возвращает ID задачи.
+
+    Параметры те же, что и у POST /analyze. Ход выполнения и итоговый отчёт доступны через GET /jobs/{job_id}.
+    """
+    job_id = JOB_MANAGER.submit(request.model_dump())
+    return {"job_id": job_id, "status": "queued"}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Возвращает состояние задачи анализа.
+
+    Возвращает:
+    - status: queued / running / done / failed
+    - progress: текущая стадия и число обработанных коммитов из общего числа
+    - report: итоговый отчёт (когда status == done)
+    - error: текст ошибки (когда status == failed)
+    """
+    job = JOB_MANAGER.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Задача {job_id} не найдена")
+    return {
+        "job_id": job["id"],
+        "status": job["status"],
+        "progress": {
+            "stage": job["stage"],
+            "done": job["done"],
+            "total": job["total"]
+        },
+        "params": job["params"],
+        "created_at": job["created_at"],
+        "updated_at": job["updated_at"],
+        "report": job["result"],
+        "error": job["error"]
+    }
+
+
+def _render_report(job_id: str, fmt: str, target_path: str):
+    """Записать отчёт задачи в JSON или отрендерить его в HTML через MRReportRenderer."""
+    report = JOB_MANAGER.store.get(job_id)["result"]
+    if fmt == "json":
+        with open(target_path, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False)
+        return
+
+    # Для рендера отчёт пишется в NDJSON, как поток /analyze/stream: его рендерер читает построчно
+    ndjson_path = f"{target_path}.ndjson"
+    try:
+        with open(ndjson_path, "w", encoding="utf-8") as f:
+            for mr in report.get("results", []):
+                f.write(json.dumps({"type": "result", "review": mr}, ensure_ascii=False) + "\n")
+            f.write(json.dumps({"type": "metadata", "metadata": report.get("metadata", {})}, ensure_ascii=False) + "\n")
+        MRReportRenderer(ndjson_path).save_html(target_path)
+    finally:
+        os.remove(ndjson_path)
+
+
+async def _serve_report(job_id: str, fmt: str, request: Request, media_type: str) -> Response:
+    """Отдать отчёт задачи из кэша рендера с ETag/304 и сжатием gzip."""
+    version = JOB_MANAGER.store.get_version(job_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail=f"Задача {job_id} не найдена")
+    if version["status"] != "done":
+        raise HTTPException(status_code=409, detail=f"Отчёт ещё не готов, статус задачи: {version['status']}")
+
+    etag = RENDERED_REPORTS.make_etag(job_id, version["updated_at"], fmt)
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+
+    # Готовый отчёт отдаётся сразу, в пул уходит только рендер
+    path = RENDERED_REPORTS.lookup(job_id, version["updated_at"], fmt)
+    if path is None:
+        loop = asyncio.get_running_loop()
+        path = await loop.run_in_executor(
+            REPORTS_EXECUTOR, RENDERED_REPORTS.get, job_id, version["updated_at"], fmt,
+            lambda target_path: _render_report(job_id, fmt, target_path)
+        )
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        return FileResponse(f"{path}.gz", media_type=media_type, headers={**headers, "Content-Encoding": "gzip"})
+    return FileResponse(path, media_type=media_type, headers=headers)
+
+
+@app.get("/reports/{job_id}.html")
+async def get_report_html(job_id: str, request: Request):
+    """HTML-отчёт завершённой фоновой задачи (рендерится один раз на версию результата)."""
+    return await _serve_report(job_id, "html", request, "text/html; charset=utf-8")
+
+
+@app.get("/reports/{job_id}.json")
+async def get_report_json(job_id: str, request: Request):
+    """Отчёт завершённой фоновой задачи в формате JSON, как в ответе POST /analyze."""
+    return await _serve_report(job_id, "json", request, "application/json")
+
+
+@app.get("/stats")
+async def review_stats(repos: Optional[List[str]] = Query(None),
+                       users: Optional[List[str]] = Query(None),
+                       start_date: Optional[str] = None,
+                       end_date: Optional[str] = None,
+                       granularity: Literal["commits", "prs"] = "commits",
+                       period: Literal["day", "week", "month"] = "month",
+                       minor: float = DEFAULT_PROBLEM_WEIGHTS["minor"],
+                       regular: float = DEFAULT_PROBLEM_WEIGHTS["regular"],
+                       critical: float = DEFAULT_PROBLEM_WEIGHTS["critical"]):
+    """
+    Статистика по сохранённым в истории ревью без повторных запросов к модели.
+
+    В историю попадает каждое завершённое ревью: POST /analyze, /analyze/stream, /analyze/bulk
+    и фоновые задачи, с incremental и без.
+
+    Параметры (query):
+    - repos, users: Фильтр по репозиториям и пользователям (можно повторять, по умолчанию — все)
+    - start_date, end_date: Период (формат YYYY-MM-DD)
+    - period: Шаг динамики — day, week или month
+    - minor, regular, critical: Веса проблем для пересчёта оценок
+
+    Возвращает распределения оценок (среднее, перцентили) в целом, по авторам (с трендом),
+    репозиториям, сложности и периодам, а также самые частые типы проблем.
+    """
+    def compute() -> Dict[str, Any]:
+        columns = ReviewColumns.from_rows(
+            REVIEW_HISTORY.iter_reviews(repos, users, start_date, end_date, granularity)
+        )
+        return aggregate(
+            columns, weights={"minor": minor, "regular": regular, "critical": critical}, period=period
+        )
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(REPORTS_EXECUTOR, compute)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Счётчики кэшей и лимитов для оценки нагрузки."""
+    return {
+        "review_cache": REVIEW_CACHE.stats(),
+        "llm": LLM_LIMITER.stats(),
+        "review_parsing": PARSE_STATS.stats(),
+        "github_cache": GITHUB_CLIENT.store.stats(),
+        "rendered_reports": RENDERED_REPORTS.stats()
+    }
+
+
 @app.get("/")
 async def read_root():
     return {
         "message": "GitHub Merge Request Analyzer API",
         "endpoints": {
-            "POST /analyze": "Анализирует Merge Requests для заданных параметров"
+            "POST /analyze": "Анализирует Merge Requests для заданных параметров",
+            "POST /analyze/bulk": "Анализ нескольких репозиториев и пользователей со сводкой по команде",
+            "POST /analyze/stream": "Тот же анализ с выдачей результатов по мере готовности (NDJSON или SSE)",
+            "POST /jobs": "Ставит анализ в фоновую очередь и возвращает ID задачи",
+            "GET /jobs/{job_id}": "Статус, прогресс и итоговый отчёт фоновой задачи",
+            "GET /reports/{job_id}.html": "HTML-отчёт фоновой задачи (с кэшем, ETag и gzip)",
+            "GET /reports/{job_id}.json": "Отчёт фоновой задачи в формате JSON (с кэшем, ETag и gzip)",
+            "GET /stats": "Статистика по сохранённым ревью: перцентили, тренды, типы проблем",
+            "GET /metrics": "Счётчики кэшей и лимитов",
+            "GET /health": "Проверка доступности сервиса"
         }
     }
 
 
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
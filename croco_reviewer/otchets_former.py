@@ -1,79 +1,195 @@
+import html
 import json
+import os
+import shutil
+import sys
+import tempfile
+from typing import Dict, Iterator, List, Optional, Any, Tuple, TextIO
+
+try:
+    import ijson
+except ImportError:  # без ijson отчёт в формате .json читается целиком
+    ijson = None
+
+
+def _e(value: Any) -> str:
+    """Экранировать значение для вставки в HTML (текст модели нельзя вставлять как есть)."""
+    return html.escape(str(value))
+
+
+def _safe_url(url: Any) -> str:
+    url = str(url or "")
+    return _e(url) if url.startswith(("https://", "http://")) else "#"
+
 
 class MRReportRenderer:
+    """
+    Рендер отчёта анализа в HTML.
+
+    Отчёт читается по одному ревью — из NDJSON (поток POST /analyze/stream или по ревью
+    на строку) или из JSON ответа POST /analyze — и сразу пишется в файл, поэтому
+    память не растёт с размером отчёта. Большой отчёт можно разбить на страницы.
+    """
+
     def __init__(self, json_path: str):
+        """
+        :param json_path: Путь к отчёту: .ndjson/.jsonl или .json
+        """
         self.json_path = json_path
-        self.report = self._load_report()
 
-    def _load_report(self):
-        with open(self.json_path, 'r', encoding='utf-8') as f:
-            return json.load(f)
+    def _iter_records(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Перебрать записи отчёта: ("metadata", метаданные) и ("result", ревью)."""
+        if self.json_path.endswith((".ndjson", ".jsonl")):
+            with open(self.json_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    record = json.loads(line)
+                    kind = record.get("type")
+                    if kind == "result":
+                        yield "result", record["review"]
+                    elif kind == "metadata":
+                        yield "metadata", record["metadata"]
+                    elif kind == "error":
+                        print(f"Анализ завершился с ошибкой: {record.get('detail')}")
+                    else:
+                        yield "result", record
+            return
+
+        if ijson is None:
+            with open(self.json_path, "r", encoding="utf-8") as f:
+                report = json.load(f)
+            yield "metadata", report.get("metadata", {})
+            for mr in report.get("results", []):
+                yield "result", mr
+            return
 
-    def _render_items(self, title, items, key_name, key_desc, key_lines):
+        with open(self.json_path, "rb") as f:
+            # В ответе /analyze метаданные идут первыми, поэтому чтение останавливается сразу
+            yield "metadata", next(ijson.items(f, "metadata", use_float=True), {})
+            f.seek(0)
+            for mr in ijson.items(f, "results.item", use_float=True):
+                yield "result", mr
+
+    @staticmethod
+    def _render_items(title: str, items: List[Dict[str, Any]], key_name: str,
+                      key_desc: Optional[str], key_lines: str) -> str:
         if not items:
             return ""
-        html = f'<div class="section-title">{title}:</div><ul>'
+        rendered = []
         for item in items:
-            lines = f" (строки: {', '.join(map(str, item.get(key_lines, [])))})" if item.get(key_lines) else ""
-            html += f"<li><strong>{item.get(key_name, '')}</strong>: {item.get(key_desc, '')}{lines}</li>"
-        html += "</ul>"
-        return html
+            lines = f" (строки: {_e(', '.join(map(str, item.get(key_lines) or [])))})" if item.get(key_lines) else ""
+            description = f": {_e(item.get(key_desc, ''))}" if key_desc else ""
+            rendered.append(f"<li><strong>{_e(item.get(key_name, ''))}</strong>{description}{lines}</li>")
+        return f'<div class="section-title">{_e(title)}:</div><ul>{"".join(rendered)}</ul>'
 
-    def _render_section(self, title, entries):
+    @staticmethod
+    def _render_section(title: str, entries: List[Dict[str, Any]]) -> str:
         if not entries:
             return ""
-        html = f'<div class="section-title">{title}:</div><ul>'
-        for e in entries:
-            affected = ", ".join(e.get("affected_components", []))
-            html += f"<li>{e.get('description', '')}<br><em>Затронутые компоненты:</em> {affected}</li>"
-        html += "</ul>"
-        return html
-
-    def _generate_html(self):
-        mr_blocks = ""
-        for mr in self.report["results"]:
-            problems_html = ""
-            for level in ["critical", "regular", "minor"]:
-                problems_html += self._render_items(
-                    f"Проблемы ({level})",
-                    mr.get("problems", {}).get(level, []),
-                    "type", "description", "lines"
-                )
-
-            antipatterns_html = self._render_items("Антипаттерны", mr.get("antipatterns", []), "name", "description", "lines")
-            positives_html = self._render_items("Положительные аспекты", mr.get("positives", []), "aspect", "lines", "lines")
-            impacts_html = self._render_section("Влияние изменений", mr.get("impacts", []))
-
-            mr_html = self.mr_template.format(
-                mr_number=mr.get("mr_number", "N/A"),
-                url=mr.get("url", "#"),
-                complexity=mr.get("complexity", "не указано"),
-                score=mr.get("score", "N/A"),
-                problems_section=problems_html,
-                antipatterns_section=antipatterns_html,
-                positives_section=positives_html,
-                impacts_section=impacts_html,
-            )
-            mr_blocks += mr_html
-
-        metadata = self.report.get("metadata", {})
-        return self.html_template.format(
-            repo=metadata.get("repo", "N/A"),
-            user=metadata.get("user", "N/A"),
-            mean_score=metadata.get("mean_score", "N/A"),
-            start=metadata.get("period", {}).get("start", "N/A"),
-            end=metadata.get("period", {}).get("end", "N/A"),
-            total=metadata.get("total", 0),
-            mr_blocks=mr_blocks
-        )
-
-    def save_html(self, output_path="mr_report.html"):
-        html_output = self._generate_html()
-        with open(output_path, "w", encoding="utf-8") as f:
-            f.write(html_output)
-        print(f"Отчёт сохранён как {output_path}")
-
-    html_template = """
+        rendered = [
+            f"<li>{_e(e.get('description', ''))}<br><em>Затронутые компоненты:</em> "
+            f"{_e(', '.join(map(str, e.get('affected_components') or [])))}</li>"
+            for e in entries
+        ]
+        return f'<div class="section-title">{_e(title)}:</div><ul>{"".join(rendered)}</ul>'
+
+    def _write_mr(self, out: TextIO, mr: Dict[str, Any]):
+        problems = mr.get("problems") or {}
+        out.write(self.mr_template.format(
+            mr_number=_e(mr.get("mr_number", "N/A")),
+            url=_safe_url(mr.get("url")),
+            complexity=_e(mr.get("complexity", "не указано")),
+            score=_e(mr.get("score", "N/A")),
+            problems_section="".join(
+                self._render_items(f"Проблемы ({level})", problems.get(level) or [], "type", "description", "lines")
+                for level in ["critical", "regular", "minor"]
+            ),
+            antipatterns_section=self._render_items(
+                "Антипаттерны", mr.get("antipatterns") or [], "name", "description", "lines"
+            ),
+            positives_section=self._render_items(
+                "Положительные аспекты", mr.get("positives") or [], "aspect", None, "lines"
+            ),
+            impacts_section=self._render_section("Влияние изменений", mr.get("impacts") or []),
+        ))
+
+    @staticmethod
+    def _page_nav(paths: List[str], current: int) -> str:
+        if len(paths) < 2:
+            return ""
+        links = [
+            f"<strong>{i + 1}</strong>" if i == current
+            else f'<a href="{_e(os.path.basename(path))}">{i + 1}</a>'
+            for i, path in enumerate(paths)
+        ]
+        return f'<p class="pages">Страницы: {" ".join(links)}</p>'
+
+    def save_html(self, output_path: str = "mr_report.html", page_size: int = 0) -> List[str]:
+        """
+        Сохранить отчёт в HTML.
+
+        :param page_size: Число MR на странице (0 — весь отчёт в одном файле).
+            Страницы сохраняются как mr_report.html, mr_report_2.html, ...
+        :return: Пути к сохранённым страницам
+        """
+        output_dir = os.path.dirname(os.path.abspath(output_path))
+        base, ext = os.path.splitext(output_path)
+        metadata = {}
+        parts = []
+        total = 0
+        part = None
+        try:
+            # Метаданные в потоке NDJSON приходят последними, поэтому блоки MR сначала
+            # пишутся во временные файлы страниц, а заголовок — при сборке
+            for kind, record in self._iter_records():
+                if kind == "metadata":
+                    metadata = record or {}
+                    continue
+                if part is None or (page_size and total % page_size == 0):
+                    if part is not None:
+                        part.close()
+                    part = tempfile.NamedTemporaryFile(
+                        "w", encoding="utf-8", dir=output_dir, suffix=".part", delete=False
+                    )
+                    parts.append(part.name)
+                self._write_mr(part, record)
+                total += 1
+            if part is not None:
+                part.close()
+
+            paths = [output_path] + [f"{base}_{page}{ext}" for page in range(2, len(parts) + 1)]
+            period = metadata.get("period") or {}
+            for page, path in enumerate(paths):
+                nav = self._page_nav(paths, page)
+                with open(path, "w", encoding="utf-8") as out:
+                    out.write(self.html_head.format(
+                        repo=_e(metadata.get("repo", "N/A")),
+                        user=_e(metadata.get("user", "N/A")),
+                        mean_score=_e(metadata.get("mean_score", "N/A")),
+                        start=_e(period.get("start", "N/A")),
+                        end=_e(period.get("end", "N/A")),
+                        total=_e(metadata.get("total", total)),
+                        page_nav=nav
+                    ))
+                    if page < len(parts):
+                        with open(parts[page], "r", encoding="utf-8") as src:
+                            shutil.copyfileobj(src, out)
+                    out.write(self.html_tail.format(page_nav=nav))
+        finally:
+            if part is not None and not part.closed:
+                part.close()
+            for part_path in parts:
+                try:
+                    os.remove(part_path)
+                except OSError:
+                    pass
+
+        print(f"Отчёт сохранён как {', '.join(paths)}")
+        return paths
+
+    html_head = """
     <!DOCTYPE html>
     <html lang="ru">
     <head>
@@ -96,8 +212,12 @@ class MRReportRenderer:
         <p><strong>Средний score:</strong> {mean_score}</p>
         <p><strong>Период:</strong> {start} — {end}</p>
         <p><strong>Всего MR:</strong> {total}</p>
+        {page_nav}
         <hr>
-        {mr_blocks}
+    """
+
+    html_tail = """
+        {page_nav}
     </body>
     </html>
     """
@@ -115,7 +235,10 @@ class MRReportRenderer:
     """
 
 
-# Пример использования
+# Пример использования: python otchets_former.py [mr_report.json|.ndjson] [mr_report.html] [MR на странице]
 if __name__ == "__main__":
-    renderer = MRReportRenderer("mr_report.json")
-    renderer.save_html("mr_report.html")
+    input_path = sys.argv[1] if len(sys.argv) > 1 else "mr_report.json"
+    output_path = sys.argv[2] if len(sys.argv) > 2 else "mr_report.html"
+    page_size = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    renderer = MRReportRenderer(input_path)
+    renderer.save_html(output_path, page_size=page_size)
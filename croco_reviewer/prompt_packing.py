@@ -0,0 +1,219 @@
+import os
+import re
+from typing import Dict, List, Tuple, Optional, Any
+
+# Грубая оценка: для кода и кириллицы в среднем около 3 символов на токен
+CHARS_PER_TOKEN = 3
+
+LOCK_FILES = {
+    "poetry.lock", "Pipfile.lock", "package-lock.json", "yarn.lock", "pnpm-lock.yaml",
+    "composer.lock", "Cargo.lock", "Gemfile.lock", "go.sum"
+}
+GENERATED_SUFFIXES = (
+    ".min.js", ".min.css", ".map", "_pb2.py", "_pb2_grpc.py", ".pb.go", ".snap"
+)
+GENERATED_DIRS = {"generated", "__generated__", "dist"}
+# Строки такой длины почти всегда означают минифицированный или сгенерированный код
+MAX_LINE_LENGTH = 1000
+
+COMPLEXITY_ORDER = {"S": 0, "M": 1, "L": 2}
+# Заголовок hunk'а: число строк до и после изменения (если не указано — 1)
+HUNK_HEADER = re.compile(r"^@@ -\d+(?:,(\d+))? \+\d+(?:,(\d+))? @@")
+
+
+def estimate_tokens(text: str) -> int:
+    """Оценить число токенов в тексте."""
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def split_diff(diff: str) -> List[Tuple[str, str]]:
+    """
+    Разбить diff коммита на пары (имя файла, patch).
+
+    Diff собирается в GitHubDiffsCollector.get_commit_diff как блоки "--- filename\\npatch",
+    а patch от GitHub всегда начинается с заголовка hunk'а "@@". Длина hunk'а берётся из его
+    заголовка, поэтому удалённая строка вида "-- комментарий" ("--- комментарий" в patch)
+    не принимается за начало нового файла.
+    """
+    files = []
+    lines = diff.split("\n")
+    current_name = None
+    current_lines = []
+    old_left = new_left = 0
+    for i, line in enumerate(lines):
+        if old_left > 0 or new_left > 0:
+            if line.startswith(("-", "+", " ", "\\")):
+                if line.startswith(("-", " ")):
+                    old_left -= 1
+                if line.startswith(("+", " ")):
+                    new_left -= 1
+                current_lines.append(line)
+                continue
+            # Patch обрезан или повреждён: считаем hunk законченным
+            old_left = new_left = 0
+
+        next_line = lines[i + 1] if i + 1 < len(lines) else ""
+        if line.startswith("--- ") and next_line.startswith("@@"):
+            if current_name is not None:
+                files.append((current_name, "\n".join(current_lines)))
+            current_name = line[4:]
+            current_lines = []
+            continue
+        header = HUNK_HEADER.match(line)
+        if header:
+            old_left = int(header.group(1)) if header.group(1) is not None else 1
+            new_left = int(header.group(2)) if header.group(2) is not None else 1
+        if current_name is not None:
+            current_lines.append(line)
+    if current_name is not None:
+        files.append((current_name, "\n".join(current_lines)))
+    return files
+
+
+def low_value_reason(filename: str, patch: str) -> Optional[str]:
+    """Причина, по которой файл не стоит отправлять модели, или None."""
+    basename = os.path.basename(filename)
+    if basename in LOCK_FILES:
+        return "lock-файл"
+    if basename.endswith(GENERATED_SUFFIXES) or GENERATED_DIRS & set(filename.split("/")[:-1]):
+        return "сгенерированный код"
+    if any(len(line) > MAX_LINE_LENGTH for line in patch.split("\n")):
+        return "минифицированный код"
+    return None
+
+
+def summarize_file(filename: str, patch: str, reason: str) -> str:
+    """Короткая заглушка вместо содержимого малоценного файла."""
+    lines = patch.split("\n")
+    added = sum(1 for line in lines if line.startswith("+"))
+    removed = sum(1 for line in lines if line.startswith("-"))
+    return f"--- {filename}\n[изменения не показаны: {reason}, +{added}/-{removed} строк]"
+
+
+def split_hunks(patch: str) -> List[str]:
+    """Разбить patch файла на hunk'и по заголовкам "@@"."""
+    hunks = []
+    current = []
+    for line in patch.split("\n"):
+        if line.startswith("@@") and current:
+            hunks.append("\n".join(current))
+            current = []
+        current.append(line)
+    if current:
+        hunks.append("\n".join(current))
+    return hunks
+
+
+def _split_oversized(text: str, budget: int) -> List[str]:
+    """Разрезать по строкам hunk, который сам по себе не помещается в бюджет."""
+    pieces = []
+    current = []
+    current_tokens = 0
+    for line in text.split("\n"):
+        line_tokens = estimate_tokens(line)
+        if current and current_tokens + line_tokens > budget:
+            pieces.append("\n".join(current))
+            current = []
+            current_tokens = 0
+        current.append(line)
+        current_tokens += line_tokens
+    if current:
+        pieces.append("\n".join(current))
+    return pieces
+
+
+def pack_diff(diff: str, budget: int) -> List[str]:
+    """
+    Подготовить diff к отправке модели в пределах бюджета токенов.
+
+    Lock-файлы, минифицированный и сгенерированный код заменяются заглушками,
+    остальное раскладывается по частям, выровненным по границам hunk'ов.
+    :param budget: Бюджет токенов на diff в одном промпте
+    :return: Список частей diff'а (одна часть, если всё помещается)
+    """
+    blocks = []
+    for filename, patch in split_diff(diff) or [(None, diff)]:
+        reason = low_value_reason(filename, patch) if filename else None
+        if reason:
+            blocks.append(summarize_file(filename, patch, reason))
+        elif filename:
+            blocks.append(f"--- {filename}\n{patch}")
+        else:
+            blocks.append(patch)
+
+    packed = "\n".join(blocks)
+    if estimate_tokens(packed) <= budget:
+        return [packed]
+
+    chunks = []
+    current = []
+    current_tokens = 0
+
+    def flush():
+        nonlocal current, current_tokens
+        if current:
+            chunks.append("\n".join(current))
+        current = []
+        current_tokens = 0
+
+    for block in blocks:
+        header, _, patch = block.partition("\n")
+        pieces = [block] if estimate_tokens(block) <= budget or not patch else [
+            f"{header}\n{piece}"
+            for hunk in split_hunks(patch)
+            for piece in _split_oversized(hunk, budget - estimate_tokens(header))
+        ]
+        for piece in pieces:
+            piece_tokens = estimate_tokens(piece)
+            if current and current_tokens + piece_tokens > budget:
+                flush()
+            current.append(piece)
+            current_tokens += piece_tokens
+    flush()
+    return chunks
+
+
+def trim_usages(usages: Dict[str, List[Tuple[str, int, str]]],
+                budget: int) -> Dict[str, List[Tuple[str, int, str]]]:
+    """
+    Урезать список применений до бюджета токенов.
+
+    Применения берутся по кругу, по одному на идентификатор, чтобы ни один
+    идентификатор не вытеснил остальные.
+    """
+    trimmed = {ident: [] for ident in usages}
+    used = 0
+    depth = 0
+    while True:
+        added = False
+        for ident, usage_list in usages.items():
+            if depth >= len(usage_list):
+                continue
+            file_path, line_no, _ = usage_list[depth]
+            cost = estimate_tokens(f"{file_path}:{line_no}, ")
+            if used + cost > budget:
+                return {ident: items for ident, items in trimmed.items() if items}
+            trimmed[ident].append(usage_list[depth])
+            used += cost
+            added = True
+        if not added:
+            return {ident: items for ident, items in trimmed.items() if items}
+        depth += 1
+
+
+def merge_reviews(reviews: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Объединить ревью частей одного коммита в одно ревью."""
+    if len(reviews) == 1:
+        return reviews[0]
+
+    merged = dict(reviews[0])
+    complexities = [r.get("complexity") for r in reviews if r.get("complexity") in COMPLEXITY_ORDER]
+    if complexities:
+        merged["complexity"] = max(complexities, key=COMPLEXITY_ORDER.get)
+    merged["problems"] = {
+        level: [item for r in reviews for item in (r.get("problems") or {}).get(level, [])]
+        for level in ("minor", "regular", "critical")
+    }
+    for key in ("antipatterns", "positives", "impacts"):
+        merged[key] = [item for r in reviews for item in r.get(key, [])]
+    return merged
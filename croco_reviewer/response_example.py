@@ -1,6 +1,9 @@
 import requests
 from datetime import datetime
 
+# True — получать ревью по мере готовности через POST /analyze/stream и сохранять их в mr_report.ndjson
+STREAM = False
+
 url = "http://localhost:8000/analyze"
 data = {
     "repo": "AlfaInsurance/devQ_testData_PythonProject",
@@ -10,7 +13,23 @@ data = {
     "local_repo_path": "local_path_if_you_have"
 }
 
-response = requests.post(url, json=data)
 import json
-with open("mr_report.json", "w", encoding="utf-8") as f:
-    json.dump(response.json(), f, ensure_ascii=False, indent=2)
+if STREAM:
+    # Записи сохраняются как пришли, и otchets_former читает такой отчёт построчно
+    with requests.post(f"{url}/stream", json=data, stream=True) as response, \
+            open("mr_report.ndjson", "w", encoding="utf-8") as f:
+        for line in response.iter_lines(decode_unicode=True):
+            if not line:
+                continue
+            record = json.loads(line)
+            if record["type"] == "result":
+                print(f"{record['done']}/{record['total']}, средняя оценка {record['mean_score']:.2f}")
+            elif record["type"] == "error":
+                raise RuntimeError(record["detail"])
+            f.write(line + "\n")
+else:
+    response = requests.post(url, json=data)
+    report = response.json()
+
+    with open("mr_report.json", "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
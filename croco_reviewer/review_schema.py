@@ -0,0 +1,129 @@
+import json
+import threading
+from typing import Dict, List, Optional, Any
+
+from pydantic import BaseModel, ConfigDict, ValidationError
+
+
+class ReviewParseError(ValueError):
+    """Ответ модели не содержит ревью в ожидаемом формате."""
+
+
+class _ReviewItem(BaseModel):
+    # Модель иногда добавляет свои поля — они не мешают и сохраняются в отчёте
+    model_config = ConfigDict(extra="allow")
+
+
+class Problem(_ReviewItem):
+    type: str = ""
+    description: str = ""
+    lines: Optional[List[Any]] = None
+
+
+class Problems(_ReviewItem):
+    minor: List[Problem] = []
+    regular: List[Problem] = []
+    critical: List[Problem] = []
+
+
+class Antipattern(_ReviewItem):
+    name: str = ""
+    description: str = ""
+    lines: Optional[List[Any]] = None
+
+
+class Positive(_ReviewItem):
+    aspect: str = ""
+    lines: Optional[List[Any]] = None
+
+
+class Impact(_ReviewItem):
+    description: str = ""
+    affected_components: List[str] = []
+
+
+class CodeReview(_ReviewItem):
+    """Ревью одного коммита в формате REVIEW_JSON_FORMAT."""
+    mr_number: Optional[int] = None
+    url: Optional[str] = None
+    complexity: Optional[str] = None
+    problems: Problems
+    antipatterns: List[Antipattern] = []
+    positives: List[Positive] = []
+    impacts: List[Impact] = []
+
+
+_decoder = json.JSONDecoder()
+
+
+def extract_json(text: str, expected: type = dict) -> Any:
+    """
+    Найти в ответе модели первое сбалансированное JSON-значение нужного типа.
+
+    Вступление, markdown-ограждения и комментарии после JSON пропускаются.
+    :param expected: dict для одного ревью, list для ответа на пачку коммитов
+    """
+    opening = "{" if expected is dict else "["
+    pos = text.find(opening)
+    while pos != -1:
+        try:
+            value, _ = _decoder.raw_decode(text, pos)
+        except json.JSONDecodeError:
+            pass
+        else:
+            if isinstance(value, expected):
+                return value
+        pos = text.find(opening, pos + 1)
+    raise ReviewParseError(f"в ответе нет JSON-{'объекта' if expected is dict else 'массива'}")
+
+
+def _validate(review: Any) -> Dict[str, Any]:
+    try:
+        return CodeReview.model_validate(review).model_dump()
+    except ValidationError as e:
+        errors = "; ".join(
+            f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}" for error in e.errors()[:5]
+        )
+        raise ReviewParseError(f"ответ не соответствует схеме ревью: {errors}")
+
+
+def parse_review(text: str) -> Dict[str, Any]:
+    """Извлечь и проверить ревью одного коммита; при ошибке — ReviewParseError с причиной."""
+    return _validate(extract_json(text, dict))
+
+
+def parse_batch_reviews(text: str) -> List[Dict[str, Any]]:
+    """Извлечь ревью пачки коммитов; элементы, не прошедшие проверку, пропускаются."""
+    reviews = []
+    for review in extract_json(text, list):
+        try:
+            reviews.append(_validate(review))
+        except ReviewParseError:
+            continue
+    return reviews
+
+
+class ParseStats:
+    """Счётчики разбора ответов по версиям модели, чтобы было видно, сколько ответов потеряно."""
+
+    outcomes = ("parsed", "repaired", "failed")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[str, int]] = {}
+
+    def record(self, model: str, outcome: str):
+        """
+        :param model: Модель и версия, например "yandexgpt/rc"
+        :param outcome: parsed — разобран сразу, repaired — после повторного запроса, failed — потерян
+        """
+        with self._lock:
+            counters = self._counters.setdefault(model, dict.fromkeys(self.outcomes, 0))
+            counters[outcome] += 1
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        with self._lock:
+            return {model: dict(counters) for model, counters in self._counters.items()}
+
+
+PARSE_STATS = ParseStats()
@@ -0,0 +1,293 @@
+import mmap
+import multiprocessing
+import os
+import re
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple, Iterator, Optional, FrozenSet
+
+SOURCE_EXTENSIONS = (".py", ".java", ".php")
+# Служебные, вендорные и бинарные каталоги, в которых нет кода проекта
+SKIP_DIRS = {
+    ".git", ".hg", ".svn", "node_modules", "vendor", "venv", ".venv",
+    "__pycache__", ".mypy_cache", ".pytest_cache", ".tox", ".idea"
+}
+TOKEN_PATTERN = re.compile(r"\w+")
+# ASCII-слова и байты UTF-8 вне ASCII; токены с такими байтами дорезаются по Unicode-\w
+BYTES_TOKEN_PATTERN = re.compile(rb"(?:\w|[\x80-\xff])+")
+
+UsageMap = Dict[str, List[Tuple[str, int, str]]]
+
+
+def iter_source_files(local_repo_path: str) -> Iterator[str]:
+    """Перебрать файлы исходного кода в локальном репозитории."""
+    for root, dirs, files in os.walk(local_repo_path):
+        dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+        for file in files:
+            if file.endswith(SOURCE_EXTENSIONS):
+                yield os.path.join(root, file)
+
+
+def _identifier_set(identifiers: List[str]) -> FrozenSet[bytes]:
+    """Идентификаторы в виде байтов для сравнения с токенами файла."""
+    return frozenset(ident.encode("utf-8") for ident in identifiers)
+
+
+def _split_unicode(token: bytes, offset: int) -> List[Tuple[bytes, int]]:
+    """
+    Разбить токен с байтами вне ASCII на слова по Unicode-\\w, как в extract_changed_identifiers.
+
+    :return: Пары (слово в UTF-8, смещение в буфере)
+    """
+    # surrogateescape сохраняет длину некорректных байтов, поэтому смещения остаются точными
+    text = token.decode("utf-8", errors="surrogateescape")
+    return [
+        (match.group(0).encode("utf-8", errors="surrogateescape"),
+         offset + len(text[:match.start()].encode("utf-8", errors="surrogateescape")))
+        for match in TOKEN_PATTERN.finditer(text)
+    ]
+
+
+def scan_file(file_path: str, identifiers: FrozenSet[bytes]) -> List[Tuple[str, int, str]]:
+    """
+    Найти все вхождения идентификаторов целым словом в файле за один проход.
+
+    Файл отображается в память через mmap и не копируется построчно. Каждый токен
+    проверяется по множеству, поэтому время не зависит от числа идентификаторов
+    (альтернатива из них в одном регулярном выражении перебирается по очереди).
+    :return: Список (идентификатор, номер строки, строка)
+    """
+    found = []
+    try:
+        with open(file_path, "rb") as f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return found
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                line_no = 1
+                pos = 0
+                seen = set()
+                for match in BYTES_TOKEN_PATTERN.finditer(buf):
+                    token = match.group(0)
+                    if token.isascii():
+                        if token not in identifiers:
+                            continue
+                        hits = [(token, match.start())]
+                    else:
+                        hits = [hit for hit in _split_unicode(token, match.start()) if hit[0] in identifiers]
+                    for token, start in hits:
+                        newlines = buf[pos:start].count(b"\n")
+                        if newlines:
+                            line_no += newlines
+                            seen.clear()
+                        pos = start
+                        ident = token.decode("utf-8")
+                        if ident in seen:
+                            continue
+                        seen.add(ident)
+                        line_start = buf.rfind(b"\n", 0, start) + 1
+                        line_end = buf.find(b"\n", start)
+                        line = buf[line_start:line_end if line_end != -1 else len(buf)]
+                        found.append((ident, line_no, line.decode("utf-8", errors="replace").strip()))
+    except (OSError, ValueError):
+        return []
+    return found
+
+
+def scan_usages(identifiers: List[str], local_repo_path: str) -> UsageMap:
+    """
+    Найти использования идентификаторов полным обходом репозитория.
+
+    Каждый файл просматривается один раз независимо от числа идентификаторов.
+    """
+    identifiers = [ident for ident in identifiers if ident]
+    if not identifiers:
+        return {}
+    wanted = _identifier_set(identifiers)
+    usage_map = {}
+    for file_path in iter_source_files(local_repo_path):
+        for ident, line_no, line in scan_file(file_path, wanted):
+            usage_map.setdefault(ident, []).append((file_path, line_no, line))
+    return usage_map
+
+
+_process_pools: Dict[int, ProcessPoolExecutor] = {}
+_process_pools_lock = threading.Lock()
+
+
+def _get_process_pool(workers: int) -> ProcessPoolExecutor:
+    """
+    Пул процессов создаётся один раз на процесс, чтобы не платить за запуск на каждый коммит.
+
+    Пул создаётся из потоков анализа, поэтому воркеры запускаются через forkserver: fork
+    многопоточного процесса может унаследовать блокировку, занятую другим потоком, и зависнуть.
+    """
+    with _process_pools_lock:
+        pool = _process_pools.get(workers)
+        if pool is None:
+            pool = _process_pools[workers] = ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("forkserver")
+            )
+        return pool
+
+
+def _scan_shard(file_paths: List[str], identifiers: FrozenSet[bytes]) -> List[Tuple[str, str, int, str]]:
+    """Просканировать часть файлов в процессе-воркере."""
+    return [
+        (ident, file_path, line_no, line)
+        for file_path in file_paths
+        for ident, line_no, line in scan_file(file_path, identifiers)
+    ]
+
+
+def parallel_scan_usages(identifiers: List[str], local_repo_path: str,
+                         workers: Optional[int] = None) -> UsageMap:
+    """
+    Найти использования идентификаторов, распределив файлы репозитория по процессам.
+
+    Результат совпадает с scan_usages, включая порядок файлов.
+    :param workers: Число процессов (по умолчанию — число ядер)
+    """
+    identifiers = [ident for ident in identifiers if ident]
+    if not identifiers:
+        return {}
+    workers = workers or os.cpu_count() or 1
+    file_paths = list(iter_source_files(local_repo_path))
+    wanted = _identifier_set(identifiers)
+
+    if workers == 1 or len(file_paths) < workers:
+        shard_results = [_scan_shard(file_paths, wanted)]
+    else:
+        # Несколько шардов на воркер сглаживают разницу в размерах файлов
+        shard_size = -(-len(file_paths) // (workers * 4))
+        shards = [file_paths[i:i + shard_size] for i in range(0, len(file_paths), shard_size)]
+        shard_results = _get_process_pool(workers).map(_scan_shard, shards, [wanted] * len(shards))
+
+    usage_map = {}
+    for shard_result in shard_results:
+        for ident, file_path, line_no, line in shard_result:
+            usage_map.setdefault(ident, []).append((file_path, line_no, line))
+    return usage_map
+
+
+class UsageIndex:
+    """
+    Индекс идентификаторов локального репозитория.
+
+    Для каждого токена хранится список файлов, где он встречается. Индекс строится
+    один раз и затем обновляется инкрементально по mtime файлов, поэтому поиск
+    применений читает только файлы, в которых идентификатор действительно есть.
+    """
+
+    _instances: Dict[str, "UsageIndex"] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, local_repo_path: str, refresh_interval: float = 30.):
+        """
+        :param local_repo_path: Путь к локальной копии репозитория
+        :param refresh_interval: Не чаще какого интервала (в секундах) сверять индекс с диском
+        """
+        self.local_repo_path = local_repo_path
+        self.refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+        self._paths: List[Optional[str]] = []        # id файла -> путь (None для устаревших записей)
+        self._file_ids: Dict[str, Tuple[int, float]] = {}  # путь -> (id файла, mtime)
+        self._postings: Dict[str, List[int]] = {}   # токен -> id файлов
+        self._stale = 0
+        self._refreshed_at: Optional[float] = None
+
+    @classmethod
+    def for_path(cls, local_repo_path: str) -> "UsageIndex":
+        """Общий для процесса индекс репозитория по указанному пути."""
+        key = os.path.abspath(local_repo_path)
+        with cls._instances_lock:
+            index = cls._instances.get(key)
+            if index is None:
+                index = cls._instances[key] = cls(local_repo_path)
+            return index
+
+    def refresh(self, force: bool = False):
+        """Переиндексировать новые и изменённые файлы, удалить исчезнувшие."""
+        with self._lock:
+            if not force and self._refreshed_at is not None \
+                    and time.monotonic() - self._refreshed_at < self.refresh_interval:
+                return
+
+            seen = set()
+            for file_path in iter_source_files(self.local_repo_path):
+                seen.add(file_path)
+                try:
+                    mtime = os.stat(file_path).st_mtime
+                except OSError:
+                    continue
+                known = self._file_ids.get(file_path)
+                if known is not None and known[1] == mtime:
+                    continue
+                if known is not None:
+                    self._drop(file_path)
+                self._add(file_path, mtime)
+
+            for file_path in [path for path in self._file_ids if path not in seen]:
+                self._drop(file_path)
+
+            # Если устаревших записей стало больше половины, пересобираем списки
+            if self._stale > len(self._file_ids):
+                self._compact()
+            self._refreshed_at = time.monotonic()
+
+    def _add(self, file_path: str, mtime: float):
+        try:
+            with open(file_path, "r", encoding="utf-8") as f:
+                tokens = set(TOKEN_PATTERN.findall(f.read()))
+        except (OSError, UnicodeDecodeError):
+            return
+        file_id = len(self._paths)
+        self._paths.append(file_path)
+        self._file_ids[file_path] = (file_id, mtime)
+        for token in tokens:
+            self._postings.setdefault(token, []).append(file_id)
+
+    def _drop(self, file_path: str):
+        file_id, _ = self._file_ids.pop(file_path)
+        self._paths[file_id] = None
+        self._stale += 1
+
+    def _compact(self):
+        remap = {}
+        paths = []
+        for file_id, file_path in enumerate(self._paths):
+            if file_path is not None:
+                remap[file_id] = len(paths)
+                self._file_ids[file_path] = (len(paths), self._file_ids[file_path][1])
+                paths.append(file_path)
+        postings = {}
+        for token, file_ids in self._postings.items():
+            alive = [remap[file_id] for file_id in file_ids if file_id in remap]
+            if alive:
+                postings[token] = alive
+        self._paths = paths
+        self._postings = postings
+        self._stale = 0
+
+    def find(self, identifiers: List[str]) -> UsageMap:
+        """Найти использования идентификаторов целым словом."""
+        identifiers = [ident for ident in identifiers if ident]
+        if not identifiers:
+            return {}
+        self.refresh()
+
+        with self._lock:
+            file_ids = sorted({
+                file_id
+                for ident in identifiers
+                for file_id in self._postings.get(ident, [])
+                if self._paths[file_id] is not None
+            })
+            candidates = [self._paths[file_id] for file_id in file_ids]
+
+        wanted = _identifier_set(identifiers)
+        usage_map = {}
+        for file_path in candidates:
+            for ident, line_no, line in scan_file(file_path, wanted):
+                usage_map.setdefault(ident, []).append((file_path, line_no, line))
+        return usage_map